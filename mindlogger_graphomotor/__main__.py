@@ -2,28 +2,113 @@
 
 import argparse
 import logging
+import sys
 from pathlib import Path
 
-from bidsi import BidsConfig, BidsWriter
-
-from .graphomotor import GraphomotorReport
+from .batch import find_exports, run_batch
+from .content_store import ContentStore
+from .instrumentation import Instrumentation
+from .passthrough import PASSTHROUGH_MODES
+from .report_preprocessors import default_preprocessors
+from .timestamps import DEFAULT_TIMEZONE
+from .watch import ExportWatcher
 
 
 def main(
-    mindlogger_export_dir: Path,
+    mindlogger_export_dirs: list[Path],
     bids_root: Path,
     config: Path,
-) -> None:
-    """Main method for command-line interface."""
+    workers: int = 1,
+    shard_workers: int = 1,
+    incremental: bool = False,
+    chunksize: int | None = None,
+    cache: bool = False,
+    fused_preprocessor: bool = False,
+    timezone: str | None = DEFAULT_TIMEZONE,
+    lazy_timestamps: bool = False,
+    extract: bool = False,
+    extract_workers: int = 1,
+    extract_processes: bool = False,
+    load_workers: int = 1,
+    load_processes: bool = False,
+    watch: Path | None = None,
+    settle_seconds: float = 30.0,
+    poll_interval: float = 5.0,
+    metrics: Path | None = None,
+    passthrough: str | None = None,
+    content_store: Path | None = None,
+    stream_artifacts: bool = False,
+    transcode_csv: bool = False,
+    pipeline_workers: int = 0,
+    queue_size: int = 64,
+) -> bool:
+    """Main method for command-line interface.
+
+    If watch is set, runs until interrupted, converting exports as they arrive
+    in the watched directory. If metrics is set, stage metrics are written to
+    it as JSON, or in Prometheus text format if its suffix is .prom. If
+    content_store is set, response files are stored once in that directory and
+    hard linked into the BIDS tree, unless another passthrough mode is set.
+    Returns whether all exports were converted successfully.
+    """
     logging.basicConfig(level=logging.DEBUG)
-    # TODO: Watch Folder
-    # TODO: Handle multiple reports
-    report = GraphomotorReport.create(mindlogger_export_dir)
-    writer = BidsWriter(bids_root, BidsConfig.from_file(config), report.bids_model())
-    print("=========== Writing BIDS ===========")
-    writer.write()
+    create_options = {
+        "chunksize": chunksize,
+        "cache": cache,
+        "preprocessors": default_preprocessors(
+            timezone, lazy_timestamps, fused_preprocessor
+        ),
+        "extract": extract,
+        "extract_workers": extract_workers,
+        "extract_processes": extract_processes,
+    }
+    model_options = {
+        "load_workers": load_workers,
+        "load_processes": load_processes,
+        "stream_artifacts": stream_artifacts or transcode_csv,
+        "transcode_csv": transcode_csv,
+        "content_store": None if content_store is None else ContentStore(content_store),
+    }
+    write_options = {
+        "passthrough": passthrough or ("hardlink" if content_store else None),
+        "build_workers": pipeline_workers,
+        "queue_size": queue_size,
+    }
+    if watch is not None:
+        ExportWatcher(
+            watch,
+            bids_root,
+            config,
+            settle_seconds=settle_seconds,
+            poll_interval=poll_interval,
+            create_options=create_options,
+            model_options=model_options,
+            metrics_path=metrics,
+            write_options=write_options,
+            incremental=incremental,
+        ).run()
+        return True
+    results = run_batch(
+        mindlogger_export_dirs,
+        bids_root,
+        config,
+        workers=workers,
+        shard_workers=shard_workers,
+        incremental=incremental,
+        create_options=create_options,
+        model_options=model_options,
+        collect_metrics=metrics is not None,
+        write_options=write_options,
+    )
+    if metrics is not None:
+        instrumentation = Instrumentation()
+        for result in results:
+            if result.metrics is not None:
+                instrumentation.merge(result.metrics)
+        instrumentation.write(metrics)
     # TODO: Report email
     # TODO: Move processed report to separate directory
+    return all(result.ok for result in results)
 
 
 def cli() -> None:
@@ -32,12 +117,24 @@ def cli() -> None:
         prog="Graphomotor BIDS",
         description="Converts Graphomotor export data from MindLogger to BIDS format.",
     )
-    parser.add_argument(
+    exports = parser.add_mutually_exclusive_group(required=True)
+    exports.add_argument(
         "--export",
         "-e",
         type=Path,
-        required=True,
-        help="Path to input data directory.",
+        nargs="+",
+        help="Path to input data directory. May be given several directories.",
+    )
+    exports.add_argument(
+        "--batch-dir",
+        type=Path,
+        help="Convert every export directory directly below this directory.",
+    )
+    exports.add_argument(
+        "--watch",
+        type=Path,
+        help="Run as a daemon, converting exports as they arrive in this directory. "
+        "Use with --incremental, or exports are converted again after a restart.",
     )
     parser.add_argument(
         "--bids_root",
@@ -52,9 +149,182 @@ def cli() -> None:
         type=Path,
         help="Config file for Bidsi.",
     )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="Number of exports converted concurrently.",
+    )
+    parser.add_argument(
+        "--shard-workers",
+        type=int,
+        default=1,
+        help="Split each export by subject after preprocessing and convert the "
+        "subjects on this many worker processes. Not used with --watch.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only convert subjects and tasks whose rows or response files changed "
+        "since they were last converted, as recorded in a ledger in the BIDS root. "
+        "The config must MERGE subject and session directories, as "
+        "config/graphomotor-incremental.toml does.",
+    )
+    parser.add_argument(
+        "--settle-seconds",
+        type=float,
+        default=30.0,
+        help="With --watch, seconds an export must be unchanged before conversion.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=5.0,
+        help="With --watch, seconds between scans if watchdog is not installed.",
+    )
+    parser.add_argument(
+        "--passthrough",
+        choices=PASSTHROUGH_MODES,
+        help="Place response files in the BIDS tree by hard link (hardlink) or "
+        "reflink (reflink), falling back to copy_file_range and buffered copies.",
+    )
+    parser.add_argument(
+        "--content-store",
+        type=Path,
+        help="Store response files once per content, by SHA-256 digest, in "
+        "this directory shared across exports, and hard link them into the BIDS "
+        "tree unless --passthrough is set.",
+    )
+    parser.add_argument(
+        "--stream-artifacts",
+        action="store_true",
+        help="Stream response files from their zips straight into the BIDS tree, "
+        "without extracting them first.",
+    )
+    parser.add_argument(
+        "--transcode-csv",
+        action="store_true",
+        help="Transcode CSV responses to TSV while writing, without reading them "
+        "into DataFrames. Implies --stream-artifacts.",
+    )
+    parser.add_argument(
+        "--pipeline-workers",
+        type=int,
+        default=0,
+        help="Write a BIDS model of each subject while this many workers build "
+        "those of later subjects, instead of building the whole model first. "
+        "Models are written one at a time, in subject order, so that shared "
+        "files are merged in the same order as without workers.",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=64,
+        help="With --pipeline-workers, maximum number of subject models waiting "
+        "to be written.",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        help="Write wall time, CPU time, process peak RSS and rows/files of each "
+        "stage to this file, as JSON, or in Prometheus text format if it ends in "
+        ".prom.",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        help="Read report files in chunks of about this many rows, split into "
+        "whole subjects, to bound memory use. The config must MERGE subject and "
+        "session directories, as config/graphomotor-incremental.toml does.",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Cache preprocessed report frames as Parquet next to each export.",
+    )
+    parser.add_argument(
+        "--fused-preprocessor",
+        action="store_true",
+        help="Preprocess reports in a single vectorized pass, for large exports.",
+    )
+    timezone_group = parser.add_mutually_exclusive_group()
+    timezone_group.add_argument(
+        "--timezone",
+        default=DEFAULT_TIMEZONE,
+        help="IANA timezone of exported timestamps.",
+    )
+    timezone_group.add_argument(
+        "--timezone-offsets",
+        action="store_true",
+        help="Export timestamps at the UTC offset of each row, from the "
+        "timezone_offset column.",
+    )
+    parser.add_argument(
+        "--lazy-timestamps",
+        action="store_true",
+        help="Keep timestamps as epoch milliseconds, formatting them only when "
+        "writing metadata.",
+    )
+    parser.add_argument(
+        "--extract",
+        action="store_true",
+        help="Extract response zips up front instead of reading them on demand.",
+    )
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=1,
+        help="Number of workers extracting response zips with --extract.",
+    )
+    parser.add_argument(
+        "--extract-processes",
+        action="store_true",
+        help="Extract with a process pool instead of a thread pool.",
+    )
+    parser.add_argument(
+        "--load-workers",
+        type=int,
+        default=1,
+        help="Number of workers reading CSV responses.",
+    )
+    parser.add_argument(
+        "--load-processes",
+        action="store_true",
+        help="Read CSV responses with a process pool instead of a thread pool.",
+    )
     args = parser.parse_args()
 
-    main(args.export, args.bids_root, args.config)
+    success = main(
+        args.export or (find_exports(args.batch_dir) if args.batch_dir else []),
+        args.bids_root,
+        args.config,
+        workers=args.workers,
+        shard_workers=args.shard_workers,
+        incremental=args.incremental,
+        chunksize=args.chunksize,
+        cache=args.cache,
+        fused_preprocessor=args.fused_preprocessor,
+        timezone=None if args.timezone_offsets else args.timezone,
+        lazy_timestamps=args.lazy_timestamps,
+        extract=args.extract,
+        extract_workers=args.extract_workers,
+        extract_processes=args.extract_processes,
+        load_workers=args.load_workers,
+        load_processes=args.load_processes,
+        watch=args.watch,
+        settle_seconds=args.settle_seconds,
+        poll_interval=args.poll_interval,
+        metrics=args.metrics,
+        passthrough=args.passthrough,
+        content_store=args.content_store,
+        stream_artifacts=args.stream_artifacts,
+        transcode_csv=args.transcode_csv,
+        pipeline_workers=args.pipeline_workers,
+        queue_size=args.queue_size,
+    )
+    if not success:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,325 @@
+"""Access to response artifacts from MindLogger exports."""
+
+from __future__ import annotations
+
+import functools
+import logging
+import threading
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import IO, Any, Protocol
+from zipfile import ZipFile, ZipInfo
+
+import pandas as pd
+
+from .extraction import MANIFEST_FILENAME, extract_member
+
+LOG = logging.getLogger(__name__)
+
+_GLOB_CHARACTERS = frozenset("*?[")
+_CRC_BLOCK_SIZE = 2**20
+
+
+class ResponseArtifact(Protocol):
+    """Protocol for a single response artifact."""
+
+    name: str
+
+    def open(self) -> IO[bytes]:
+        """Open artifact for binary reading."""
+        pass
+
+    def path(self) -> Path:
+        """Return Path to artifact on disk, materializing it if required."""
+        pass
+
+    def deferred_path(self) -> Path:
+        """Return Path to artifact, which may only be written on copy.
+
+        Artifacts that are not on disk must be passed to passthrough_copies by
+        their deferred paths, so that copies of them stream the artifact instead.
+        """
+        pass
+
+    def content_key(self) -> str:
+        """Key of artifact content, from its CRC32 and size in bytes."""
+        pass
+
+
+class ArtifactStore(Protocol):
+    """Protocol for a collection of response artifacts."""
+
+    def artifacts(self) -> list[ResponseArtifact]:
+        """List artifacts in store."""
+        pass
+
+    def close(self) -> None:
+        """Release open handles of store, if any."""
+        pass
+
+
+def file_crc32(path: Path) -> int:
+    """CRC32 of file content, as stored for zip archive members."""
+    crc = 0
+    with path.open("rb") as file:
+        while block := file.read(_CRC_BLOCK_SIZE):
+            crc = zlib.crc32(block, crc)
+    return crc
+
+
+class FileArtifact(ResponseArtifact):
+    """Response artifact stored as a file on disk."""
+
+    def __init__(self, path: Path) -> None:
+        """Initialize artifact for file."""
+        self._path = path
+        self.name = path.name
+
+    def open(self) -> IO[bytes]:
+        """Open file for binary reading."""
+        return self._path.open("rb")
+
+    def path(self) -> Path:
+        """Return Path to file."""
+        return self._path
+
+    def deferred_path(self) -> Path:
+        """Return Path to file."""
+        return self._path
+
+    def content_key(self) -> str:
+        """Key of file content, computing its CRC32 as a zip archive would."""
+        return f"{file_crc32(self._path):08x}-{self._path.stat().st_size}"
+
+
+class DirectoryArtifactStore(ArtifactStore):
+    """Artifacts in an extracted response directory."""
+
+    def __init__(self, directory: Path) -> None:
+        """Initialize store for directory."""
+        self.directory = directory
+
+    def artifacts(self) -> list[ResponseArtifact]:
+        """List top-level entries of directory, except the extraction manifest."""
+        return [
+            FileArtifact(path)
+            for path in self.directory.iterdir()
+            if path.name != MANIFEST_FILENAME
+        ]
+
+    def close(self) -> None:
+        """Nothing to release, files are opened per artifact."""
+
+
+class ZipMemberArtifact(ResponseArtifact):
+    """Response artifact stored as a member of a zip archive."""
+
+    def __init__(self, store: ZipArtifactStore, info: ZipInfo) -> None:
+        """Initialize artifact for archive member."""
+        self._store = store
+        self.info = info
+        self.name = PurePosixPath(info.filename).name
+
+    def __reduce__(self) -> tuple:
+        """Pickle by archive and member, without the store's member list."""
+        return (
+            _zip_member_artifact,
+            (self._store.archive, self._store.extract_dir, self.info),
+        )
+
+    def open(self) -> IO[bytes]:
+        """Stream member directly from archive."""
+        return self._store.open(self.info)
+
+    def path(self) -> Path:
+        """Extract member on first request and return its Path."""
+        return self._store.materialize(self.info)
+
+    def deferred_path(self) -> Path:
+        """Return Path member would be extracted to, without extracting it."""
+        return self._store.member_path(self.info)
+
+    def content_key(self) -> str:
+        """Key of member content, from the CRC32 and size in the archive."""
+        return f"{self.info.CRC:08x}-{self.info.file_size}"
+
+
+class ZipArtifactStore(ArtifactStore):
+    """Artifacts read on demand from a response zip archive.
+
+    The central directory is read once. Members are streamed from the archive
+    when opened, and only extracted to ``extract_dir`` when a Path is requested.
+    Files left in ``extract_dir`` by earlier extractions are only used if their
+    CRC32 matches the member.
+    """
+
+    def __init__(self, archive: Path, extract_dir: Path) -> None:
+        """Initialize store, reading archive central directory."""
+        self.archive = archive
+        self.extract_dir = extract_dir
+        with ZipFile(archive) as zip_file:
+            self._members = [info for info in zip_file.infolist() if not info.is_dir()]
+        self._zip_file: ZipFile | None = None
+        self._lock = threading.Lock()
+        # Members extracted or checked by this store.
+        self._materialized: set[str] = set()
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Drop open archive handle and lock when pickling."""
+        state = self.__dict__.copy()
+        state["_zip_file"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """Restore store from pickled state."""
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _open_archive(self) -> ZipFile:
+        """Return shared archive handle, opening it on first use."""
+        with self._lock:
+            if self._zip_file is None:
+                self._zip_file = ZipFile(self.archive)
+            return self._zip_file
+
+    def artifacts(self) -> list[ResponseArtifact]:
+        """List file members of archive."""
+        return [ZipMemberArtifact(self, info) for info in self._members]
+
+    def open(self, info: ZipInfo) -> IO[bytes]:
+        """Open archive member for binary reading."""
+        return self._open_archive().open(info)
+
+    def member_path(self, info: ZipInfo) -> Path:
+        """Path archive member is extracted to."""
+        return self.extract_dir / info.filename
+
+    def materialize(self, info: ZipInfo) -> Path:
+        """Extract single archive member, unless already extracted."""
+        path = self.member_path(info)
+        if info.filename in self._materialized:
+            return path
+        if not (
+            path.is_file()
+            and path.stat().st_size == info.file_size
+            and file_crc32(path) == info.CRC
+        ):
+            LOG.debug(f"Extracting {info.filename} from {self.archive}")
+            self.extract_dir.mkdir(parents=True, exist_ok=True)
+            extract_member(self._open_archive(), info, self.extract_dir)
+        self._materialized.add(info.filename)
+        return path
+
+    def close(self) -> None:
+        """Close archive handle, if open."""
+        with self._lock:
+            if self._zip_file is not None:
+                self._zip_file.close()
+                self._zip_file = None
+
+
+# Stores of artifacts unpickled in worker processes, keyed by archive and
+# extraction directory, so that each process reads a central directory once.
+_PROCESS_STORES: dict[tuple[Path, Path], ZipArtifactStore] = {}
+
+
+def _zip_member_artifact(
+    archive: Path, extract_dir: Path, info: ZipInfo
+) -> ZipMemberArtifact:
+    """Rebuild pickled zip member artifact on the per-process store."""
+    store = _PROCESS_STORES.get((archive, extract_dir))
+    if store is None:
+        store = ZipArtifactStore(archive, extract_dir)
+        _PROCESS_STORES[(archive, extract_dir)] = store
+    return ZipMemberArtifact(store, info)
+
+
+def _read_csv_artifact(artifact: ResponseArtifact) -> tuple[pd.DataFrame, float]:
+    """Read CSV artifact, returning frame and seconds spent reading."""
+    start = time.perf_counter()
+    with artifact.open() as csv_file:
+        frame = pd.read_csv(csv_file)
+    return frame, time.perf_counter() - start
+
+
+def read_csv_artifacts(
+    artifacts: list[ResponseArtifact],
+    max_workers: int = 1,
+    use_processes: bool = False,
+) -> list[tuple[pd.DataFrame, float]]:
+    """Read CSV artifacts on a pool of workers.
+
+    Returns frames with the seconds spent reading each, in the order of
+    artifacts. A single worker reads on the calling thread.
+    """
+    if max_workers <= 1:
+        return [_read_csv_artifact(artifact) for artifact in artifacts]
+    executor: Executor
+    if use_processes:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    with executor:
+        chunksize = max(1, len(artifacts) // (max_workers * 4))
+        return list(executor.map(_read_csv_artifact, artifacts, chunksize=chunksize))
+
+
+class ResponseArtifactIndex:
+    """Index of response artifacts, built once per report.
+
+    Artifacts are keyed by source (e.g. ``media``, ``drawing``, ``trails``) and
+    filename, so that lookups do not rescan the response stores.
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty index."""
+        # Partial rather than lambda, so that the index can be pickled.
+        self._by_name: dict[str, dict[str, list[ResponseArtifact]]] = defaultdict(
+            functools.partial(defaultdict, list)
+        )
+
+    def __len__(self) -> int:
+        """Number of indexed artifacts."""
+        return sum(
+            len(artifacts)
+            for names in self._by_name.values()
+            for artifacts in names.values()
+        )
+
+    def add(self, source: str, artifact: ResponseArtifact) -> None:
+        """Add artifact from source to index."""
+        self._by_name[source][artifact.name].append(artifact)
+
+    def search(self, source: str, search: str) -> list[ResponseArtifact]:
+        """Find artifacts from source matching search string.
+
+        Plain filenames are looked up directly. Search strings containing glob
+        characters or path separators fall back to ``Path.match`` over the
+        artifacts of that source.
+        """
+        names = self._by_name.get(source, {})
+        if "/" not in search and _GLOB_CHARACTERS.isdisjoint(search):
+            return list(names.get(search, []))
+        return [
+            artifact
+            for artifacts in names.values()
+            for artifact in artifacts
+            if PurePosixPath(artifact.name).match(search)
+        ]
+
+    @classmethod
+    def from_stores(
+        cls,
+        stores: dict[str, ArtifactStore],
+    ) -> ResponseArtifactIndex:
+        """Build index from the artifacts of each source store."""
+        index = cls()
+        for source, store in stores.items():
+            for artifact in store.artifacts():
+                index.add(source, artifact)
+        LOG.debug(f"Indexed {len(index)} response artifacts.")
+        return index
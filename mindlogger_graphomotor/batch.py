@@ -0,0 +1,452 @@
+"""Conversion of multiple MindLogger exports."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import AbstractContextManager, ExitStack, closing, nullcontext
+from pathlib import Path
+from typing import Any
+
+from bidsi import BidsConfig, BidsWriter
+
+from .graphomotor import GraphomotorReport
+from .instrumentation import Instrumentation, collecting, stage
+from .ledger import ConversionLedger, conversion_settings
+from .passthrough import passthrough_copies
+from .pipeline import write_models
+
+try:
+    import tomllib
+
+    HAS_TOMLLIB = True
+except ImportError:
+    HAS_TOMLLIB = False
+
+LOG = logging.getLogger(__name__)
+
+# BIDS config merge modes of directories holding several tasks of a subject.
+_SUBJECT_MERGE_MODES = ("subject_dir", "session_dir")
+
+
+class ExportResult:
+    """Outcome of converting a single export."""
+
+    def __init__(
+        self,
+        export_dir: Path,
+        seconds: float,
+        rows: int = 0,
+        error: str | None = None,
+        metrics: dict[str, dict] | None = None,
+    ) -> None:
+        """Initialize export result.
+
+        Metrics are the stage metrics of the conversion, if collected.
+        """
+        self.export_dir = export_dir
+        self.seconds = seconds
+        self.rows = rows
+        self.error = error
+        self.metrics = metrics
+
+    @property
+    def ok(self) -> bool:
+        """Whether export was converted successfully."""
+        return self.error is None
+
+
+def find_exports(directory: Path) -> list[Path]:
+    """Find export directories directly below directory."""
+    return sorted(
+        path
+        for path in directory.iterdir()
+        if path.is_dir() and GraphomotorReport.is_export(path)
+    )
+
+
+def convert_export(
+    export_dir: Path,
+    bids_root: Path,
+    config: Path | BidsConfig,
+    write_lock: AbstractContextManager | None = None,
+    create_options: dict[str, Any] | None = None,
+    model_options: dict[str, Any] | None = None,
+    collect_metrics: bool = False,
+    write_options: dict[str, Any] | None = None,
+    shard_workers: int = 1,
+    incremental: bool = False,
+    ledger_settings: str | None = None,
+) -> ExportResult:
+    """Convert export to BIDS, returning errors in the result instead of raising.
+
+    The export is read with GraphomotorReport.stream, so create_options may set
+    a chunksize to convert and write it in blocks of studies. Config may be a
+    path or an already loaded BidsConfig. Writes are done while
+    holding write_lock, so that exports converted concurrently do not merge
+    into shared BIDS files at the same time. If collect_metrics is set, stage
+    metrics of the conversion are returned in the result. A passthrough mode
+    in write_options places response files with link_or_copy, and
+    stream_artifacts in model_options streams zipped responses to the BIDS
+    tree. Setting build_workers in write_options writes the model of each
+    subject while later ones are built. If shard_workers is above one, each
+    preprocessed report is split by subject and the shards are converted on
+    that many worker processes. If incremental is set, only subjects and tasks
+    whose source rows or artifacts changed since they were last converted into
+    bids_root with the same config and package version, according to its
+    ledger, are converted. The ledger is kept for ledger_settings, by default
+    the conversion_settings of config, which must then be a path. Incremental
+    and chunked conversions write subjects in parts, so config must merge
+    subject directories, see check_partial_writes.
+    """
+    start = time.perf_counter()
+    rows = 0
+    error = None
+    instrumentation = Instrumentation()
+    with (
+        collecting(instrumentation) if collect_metrics else nullcontext(),
+        _ShardPool(shard_workers, write_lock) as shard_pool,
+        # Reading starts on the first report, so errors are caught below.
+        closing(
+            GraphomotorReport.stream(export_dir, **(create_options or {}))
+        ) as reports,
+    ):
+        try:
+            ledger = None
+            if incremental:
+                if ledger_settings is None:
+                    if not isinstance(config, Path):
+                        raise ValueError(
+                            "Incremental conversion of a loaded BIDS config needs "
+                            "ledger_settings."
+                        )
+                    ledger_settings = conversion_settings(config)
+                ledger = ConversionLedger(bids_root, ledger_settings)
+            if shard_pool is None and not isinstance(config, BidsConfig):
+                config = BidsConfig.from_file(config)
+            while True:
+                with stage("read") as counter:
+                    report = next(reports, None)
+                    counter.rows = 0 if report is None else len(report)
+                if report is None:
+                    break
+                if ledger is not None:
+                    digests = report.task_digests()
+                    changed = ledger.changed(digests)
+                    LOG.info(f"{len(changed)} of {len(digests)} tasks changed.")
+                    if not changed:
+                        continue
+                    report = report.select_tasks(changed)
+                if shard_pool is not None:
+                    instrumentation.merge(
+                        shard_pool.write(
+                            report,
+                            export_dir,
+                            bids_root,
+                            config,
+                            model_options or {},
+                            collect_metrics,
+                            write_options or {},
+                        )
+                    )
+                else:
+                    _write_report(
+                        report,
+                        export_dir,
+                        bids_root,
+                        config,
+                        write_lock,
+                        model_options or {},
+                        **(write_options or {}),
+                    )
+                rows += len(report)
+                if ledger is not None:
+                    ledger.record(changed)
+            if ledger is not None:
+                with write_lock or nullcontext():
+                    ledger.save()
+        except Exception as exception:
+            LOG.exception(f"Failed to convert {export_dir}")
+            error = repr(exception)
+    return ExportResult(
+        export_dir,
+        time.perf_counter() - start,
+        rows=rows if error is None else 0,
+        error=error,
+        metrics=instrumentation.to_dict() if collect_metrics else None,
+    )
+
+
+def check_partial_writes(config: Path | None) -> None:
+    """Raise ValueError if BIDS config overwrites subject directories.
+
+    Incremental and chunked conversions write some tasks of a subject at a
+    time, so the subject and session directories written before must be
+    merged, not replaced. Checked only if tomllib is available.
+    """
+    if config is None or not HAS_TOMLLIB:
+        return
+    with config.open("rb") as file:
+        merge = tomllib.load(file).get("merge", {})
+    overwritten = [key for key in _SUBJECT_MERGE_MODES if merge.get(key) == "OVERWRITE"]
+    if overwritten:
+        raise ValueError(
+            f"Incremental and chunked conversions write subjects in parts, but "
+            f"{config} overwrites {', '.join(overwritten)}; set them to MERGE, "
+            f"e.g. with config/graphomotor-incremental.toml."
+        )
+
+
+class _ShardPool:
+    """Worker processes converting subject shards of reports, if more than one.
+
+    Shards share a write lock, the given one or a new managed one, so that
+    they do not merge into shared BIDS files, e.g. participants.tsv, at the
+    same time. Entering the pool returns None for a single worker.
+    """
+
+    def __init__(
+        self, workers: int, write_lock: AbstractContextManager | None = None
+    ) -> None:
+        """Initialize pool of workers processes."""
+        self.workers = workers
+        self._write_lock = write_lock
+        self._stack = ExitStack()
+        self._executor: ProcessPoolExecutor | None = None
+
+    def __enter__(self) -> _ShardPool | None:
+        """Start worker processes, and a lock manager if needed."""
+        if self.workers <= 1:
+            return None
+        if self._write_lock is None:
+            manager = self._stack.enter_context(multiprocessing.Manager())
+            self._write_lock = manager.Lock()
+        self._executor = self._stack.enter_context(
+            ProcessPoolExecutor(max_workers=self.workers)
+        )
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Stop worker processes."""
+        self._stack.close()
+
+    def write(
+        self,
+        report: GraphomotorReport,
+        export_dir: Path,
+        bids_root: Path,
+        config: Path | BidsConfig,
+        model_options: dict[str, Any],
+        collect_metrics: bool,
+        write_options: dict[str, Any],
+    ) -> dict[str, dict]:
+        """Write subject shards of report on the workers, returning metrics."""
+        executor, write_lock = self._executor, self._write_lock
+        if executor is None or write_lock is None:
+            raise RuntimeError("Shard pool must be entered before writing.")
+        with stage("split_subjects", rows=len(report)):
+            shards = report.split_subjects(self.workers)
+        futures = [
+            executor.submit(
+                _write_shard,
+                shard,
+                export_dir,
+                bids_root,
+                config,
+                write_lock,
+                model_options,
+                collect_metrics,
+                write_options,
+            )
+            for shard in shards
+        ]
+        instrumentation = Instrumentation()
+        for future in futures:
+            instrumentation.merge(future.result())
+        return instrumentation.to_dict()
+
+
+def _write_shard(
+    report: GraphomotorReport,
+    export_dir: Path,
+    bids_root: Path,
+    config: Path | BidsConfig,
+    write_lock: AbstractContextManager,
+    model_options: dict[str, Any],
+    collect_metrics: bool,
+    write_options: dict[str, Any],
+) -> dict[str, dict]:
+    """Write subject shard of report in a worker process, returning metrics."""
+    instrumentation = Instrumentation()
+    with collecting(instrumentation) if collect_metrics else nullcontext():
+        if not isinstance(config, BidsConfig):
+            config = BidsConfig.from_file(config)
+        _write_report(
+            report,
+            export_dir,
+            bids_root,
+            config,
+            write_lock,
+            model_options,
+            **write_options,
+        )
+    return instrumentation.to_dict()
+
+
+def _write_report(
+    report: GraphomotorReport,
+    export_dir: Path,
+    bids_root: Path,
+    config: BidsConfig,
+    write_lock: AbstractContextManager | None,
+    model_options: dict[str, Any],
+    passthrough: str | None = None,
+    build_workers: int = 0,
+    queue_size: int = 64,
+) -> None:
+    """Write report to BIDS, passing response files through if a mode is set.
+
+    Deferred artifacts of the report are streamed to the BIDS tree. If
+    build_workers is set, a model of each subject is written while those of
+    later subjects are built by that many workers, instead of building the
+    whole model first. Models are written one at a time, in subject order.
+    Responses are then loaded one subject at a time, so the load options of
+    model_options do not apply.
+    """
+    # Copies are always routed, so that BIDS outputs hard linked to stored or
+    # extracted response files by an earlier conversion are replaced, not
+    # written in place.
+    copies = passthrough_copies(passthrough, report.deferred_artifacts)
+    if build_workers:
+
+        def subject_entities(subject: GraphomotorReport) -> list[dict[str, Any]]:
+            return list(
+                subject.iter_bids_entities(
+                    stream_artifacts=model_options.get("stream_artifacts", False),
+                    transcode_csv=model_options.get("transcode_csv", False),
+                    content_store=model_options.get("content_store"),
+                )
+            )
+
+        print(f"=========== Writing BIDS: {export_dir} ===========")
+        with copies:
+            asyncio.run(
+                write_models(
+                    report.iter_subjects(),
+                    subject_entities,
+                    bids_root,
+                    config,
+                    build_workers=build_workers,
+                    queue_size=queue_size,
+                    write_lock=write_lock,
+                )
+            )
+        return
+    with stage("bids_model", rows=len(report)):
+        model = report.bids_model(**model_options)
+    writer = BidsWriter(bids_root, config, model)
+    with write_lock or nullcontext():
+        print(f"=========== Writing BIDS: {export_dir} ===========")
+        with stage("bids_write", rows=len(report)), copies:
+            writer.write()
+
+
+def run_batch(
+    export_dirs: list[Path],
+    bids_root: Path,
+    config: Path,
+    workers: int = 1,
+    create_options: dict[str, Any] | None = None,
+    model_options: dict[str, Any] | None = None,
+    collect_metrics: bool = False,
+    write_options: dict[str, Any] | None = None,
+    shard_workers: int = 1,
+    incremental: bool = False,
+) -> list[ExportResult]:
+    """Convert exports on a pool of at most workers processes.
+
+    Each export is converted in isolation, and a failure does not stop the
+    remaining exports. Logs a summary of throughput and failures. If
+    collect_metrics is set, each result holds the stage metrics of its export.
+    Each export is split by subject over shard_workers processes, if above one.
+    If incremental is set, unchanged subjects and tasks are not converted again.
+    Raises ValueError if config overwrites subjects written in parts.
+    """
+    if incremental or (create_options or {}).get("chunksize"):
+        check_partial_writes(config)
+    start = time.perf_counter()
+    results: list[ExportResult]
+    if workers <= 1 or len(export_dirs) <= 1:
+        results = [
+            convert_export(
+                export_dir,
+                bids_root,
+                config,
+                create_options=create_options,
+                model_options=model_options,
+                collect_metrics=collect_metrics,
+                write_options=write_options,
+                shard_workers=shard_workers,
+                incremental=incremental,
+            )
+            for export_dir in export_dirs
+        ]
+    else:
+        with (
+            multiprocessing.Manager() as manager,
+            ProcessPoolExecutor(max_workers=min(workers, len(export_dirs))) as executor,
+        ):
+            write_lock = manager.Lock()
+            futures = [
+                executor.submit(
+                    convert_export,
+                    export_dir,
+                    bids_root,
+                    config,
+                    write_lock,
+                    create_options,
+                    model_options,
+                    collect_metrics,
+                    write_options,
+                    shard_workers,
+                    incremental,
+                )
+                for export_dir in export_dirs
+            ]
+            results = [
+                _export_result(export_dir, future)
+                for export_dir, future in zip(export_dirs, futures)
+            ]
+    _log_summary(results, time.perf_counter() - start)
+    return results
+
+
+def _export_result(export_dir: Path, future: Future[ExportResult]) -> ExportResult:
+    """Result of converting export on a worker, or its error if the worker died.
+
+    convert_export returns its own errors, so this only catches failures of
+    the pool, e.g. BrokenProcessPool when a worker is killed for running out
+    of memory, which also fail the exports still pending on the pool.
+    """
+    try:
+        return future.result()
+    except Exception as exception:
+        LOG.error(f"Worker converting {export_dir} failed: {exception!r}")
+        return ExportResult(export_dir, 0.0, error=repr(exception))
+
+
+def _log_summary(results: list[ExportResult], seconds: float) -> None:
+    """Log throughput and failures of batch."""
+    converted = [result for result in results if result.ok]
+    rows = sum(result.rows for result in converted)
+    LOG.info(
+        f"Converted {len(converted)}/{len(results)} exports, {rows} report rows "
+        f"in {seconds:.1f}s ({len(results) / seconds:.2f} exports/s, "
+        f"{rows / seconds:.0f} rows/s)."
+    )
+    for result in results:
+        if not result.ok:
+            LOG.error(f"Failed: {result.export_dir}: {result.error}")
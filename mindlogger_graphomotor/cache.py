@@ -0,0 +1,124 @@
+"""Parquet cache of preprocessed report frames."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from .ledger import package_version
+from .report_preprocessors import ReportPreprocessor
+from .schemas import ACTIVITY_USER_JOURNEY_DTYPES, HAS_PYARROW, REPORT_DTYPES
+
+LOG = logging.getLogger(__name__)
+
+CACHE_DIRNAME = ".graphomotor-cache"
+# Bump to invalidate existing caches when the cached frame layout changes.
+_CACHE_FORMAT_VERSION = "2"
+_HASH_BLOCK_SIZE = 2**20
+_TIMESTAMP_COLUMNS = ("activity_start_time", "activity_end_time")
+
+
+def _file_digest(path: Path) -> str:
+    """Hash file contents."""
+    digest = hashlib.blake2b()
+    with path.open("rb") as file:
+        while block := file.read(_HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def preprocessor_identity(preprocessor: ReportPreprocessor) -> str:
+    """Identify preprocessor by class and configuration."""
+    cls = type(preprocessor)
+    return f"{cls.__module__}.{cls.__qualname__}{sorted(vars(preprocessor).items())!r}"
+
+
+class PreprocessedCache:
+    """Cache of preprocessed report and activity frames next to an export.
+
+    Entries are keyed by the hashes of the source CSV files, the identity of
+    the preprocessor chain, the package version and the dtypes the CSV files
+    are read with. Entries with any other key are removed when the cache is
+    read or written, so the cache holds at most one entry.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        source_files: list[Path],
+        preprocessors: list[ReportPreprocessor],
+    ) -> None:
+        """Initialize cache for source files and preprocessor chain."""
+        self.cache_dir = cache_dir
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(_CACHE_FORMAT_VERSION.encode())
+        digest.update(package_version().encode())
+        for dtypes in (REPORT_DTYPES, ACTIVITY_USER_JOURNEY_DTYPES):
+            digest.update(repr(sorted(dtypes.items())).encode())
+        for path in source_files:
+            digest.update(_file_digest(path).encode())
+        for preprocessor in preprocessors:
+            digest.update(preprocessor_identity(preprocessor).encode())
+        self.key = digest.hexdigest()
+
+    @property
+    def _report_path(self) -> Path:
+        return self.cache_dir / f"{self.key}.report.parquet"
+
+    @property
+    def _activity_path(self) -> Path:
+        return self.cache_dir / f"{self.key}.activity.parquet"
+
+    def _remove_stale(self) -> None:
+        """Remove cache entries with other keys."""
+        if not self.cache_dir.is_dir():
+            return
+        for path in self.cache_dir.glob("*.parquet"):
+            if not path.name.startswith(f"{self.key}."):
+                LOG.debug(f"Removing stale cache entry {path}")
+                path.unlink(missing_ok=True)
+
+    def load(self) -> tuple[pd.DataFrame, pd.DataFrame] | None:
+        """Load cached report and activity frames, or None on a cache miss."""
+        self._remove_stale()
+        if not HAS_PYARROW:
+            LOG.warning("pyarrow not installed, preprocessed cache disabled.")
+            return None
+        if not (self._report_path.is_file() and self._activity_path.is_file()):
+            return None
+        LOG.info(f"Loading preprocessed frames from {self.cache_dir}")
+        return pd.read_parquet(self._report_path), pd.read_parquet(self._activity_path)
+
+    def store(self, report: pd.DataFrame, activity: pd.DataFrame) -> None:
+        """Store preprocessed report and activity frames.
+
+        Timestamps converted to per-row UTC offsets are of object dtype, which
+        Parquet stores at a single offset, so such reports are not stored.
+        Lazily converted timestamps are stored as epoch milliseconds.
+        """
+        if not HAS_PYARROW:
+            return
+        if any(
+            pd.api.types.is_object_dtype(report[column])
+            for column in _TIMESTAMP_COLUMNS
+            if column in report
+        ):
+            LOG.warning(
+                "Timestamps at per-row UTC offsets are not cached, "
+                "use lazy timestamps to cache them."
+            )
+            return
+        self.cache_dir.mkdir(exist_ok=True)
+        self._remove_stale()
+        # Write to temporary files first, so that readers never see a partial entry.
+        for frame, path in (
+            (report, self._report_path),
+            (activity, self._activity_path),
+        ):
+            partial = path.with_suffix(".partial")
+            frame.to_parquet(partial)
+            partial.replace(path)
+        LOG.debug(f"Stored preprocessed frames in {self.cache_dir}")
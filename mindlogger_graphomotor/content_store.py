@@ -0,0 +1,75 @@
+"""Content-addressed store of response artifacts shared across exports."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path, PurePosixPath
+from typing import IO
+
+from .artifacts import ResponseArtifact
+from .passthrough import stream_artifact
+
+LOG = logging.getLogger(__name__)
+
+CONTENT_STORE_DIRNAME = ".graphomotor-store"
+_HASH_BLOCK_SIZE = 2**20
+# Read-only, so that writes to BIDS outputs linked to stored files fail.
+_STORED_MODE = 0o444
+
+
+def _sha256(file: IO[bytes]) -> str:
+    """Hex SHA-256 digest of the content of binary file."""
+    digest = hashlib.sha256()
+    while block := file.read(_HASH_BLOCK_SIZE):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+class ContentStore:
+    """Response artifacts stored once per content, by its SHA-256 digest.
+
+    Artifacts are stored as ``<directory>/<digest[:2]>/<digest><suffix>``,
+    keeping the suffix of the artifact name. The same artifact in several
+    exports is only written to the store once. BIDS outputs written within
+    ``passthrough_copies("hardlink")`` then link to the stored file instead of
+    holding a copy, so stored files are read-only and must not be modified.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        """Initialize store in directory, created when first written."""
+        self.directory = directory
+
+    def path(self, digest: str, name: str) -> Path:
+        """Path content of digest is stored at, with the suffix of name."""
+        return self.directory / digest[:2] / f"{digest}{PurePosixPath(name).suffix}"
+
+    def add(self, artifact: ResponseArtifact) -> Path:
+        """Store artifact, unless already stored, and return its stored Path.
+
+        Artifacts that can be opened are hashed first, and not written if their
+        content is stored. Others, e.g. transcoded ones, are hashed once written.
+        Artifacts are written to a temporary file first and moved into place,
+        so that concurrent writers never expose partially written files.
+        """
+        if getattr(artifact, "write_to", None) is None:
+            with artifact.open() as file:
+                path = self.path(_sha256(file), artifact.name)
+            if path.is_file():
+                return path
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = self.directory / f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            stream_artifact(artifact, temporary)
+            with temporary.open("rb") as file:
+                path = self.path(_sha256(file), artifact.name)
+            if not path.is_file():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.chmod(temporary, _STORED_MODE)
+                os.replace(temporary, path)
+                LOG.debug(f"Stored {artifact.name} as {path}")
+        finally:
+            temporary.unlink(missing_ok=True)
+        return path
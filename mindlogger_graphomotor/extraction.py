@@ -0,0 +1,220 @@
+"""Extraction of response zip archives."""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from zipfile import ZipFile, ZipInfo
+
+LOG = logging.getLogger(__name__)
+
+# Number of member batches queued per worker, so that large members do not
+# leave the other workers idle at the end of the run.
+_BATCHES_PER_WORKER = 4
+MANIFEST_FILENAME = ".extraction-manifest.json"
+
+
+class ExtractionStats:
+    """Totals and throughput of an extraction run."""
+
+    def __init__(self, files: int, size: int, seconds: float) -> None:
+        """Initialize extraction stats."""
+        self.files = files
+        self.bytes = size
+        self.seconds = seconds
+
+    @property
+    def files_per_second(self) -> float:
+        """Files extracted per second."""
+        return self.files / self.seconds if self.seconds > 0 else float("inf")
+
+    @property
+    def bytes_per_second(self) -> float:
+        """Uncompressed bytes extracted per second."""
+        return self.bytes / self.seconds if self.seconds > 0 else float("inf")
+
+    def __repr__(self) -> str:
+        """Summarize extraction stats."""
+        return (
+            f"{self.files} files, {self.bytes} bytes in {self.seconds:.3f}s "
+            f"({self.files_per_second:.1f} files/s, "
+            f"{self.bytes_per_second / 2**20:.1f} MiB/s)"
+        )
+
+
+def extract_member(zip_file: ZipFile, info: ZipInfo, destination: Path) -> Path:
+    """Extract archive member below destination, returning its Path.
+
+    A previously extracted file is unlinked first instead of being written in
+    place, since BIDS outputs may be hard linked to it.
+    """
+    (destination / info.filename).unlink(missing_ok=True)
+    return Path(zip_file.extract(info, destination))
+
+
+def _extract_members(archive: Path, destination: Path, members: list[str]) -> int:
+    """Extract named members of archive, returning uncompressed bytes written."""
+    size = 0
+    with ZipFile(archive) as zip_file:
+        for member in members:
+            info = zip_file.getinfo(member)
+            extract_member(zip_file, info, destination)
+            size += info.file_size
+    return size
+
+
+def _read_manifest(destination: Path) -> dict:
+    """Read extraction manifest from destination, or empty manifest if invalid."""
+    try:
+        manifest = json.loads((destination / MANIFEST_FILENAME).read_text())
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def _write_manifest(destination: Path, archive: Path, infos: list[ZipInfo]) -> None:
+    """Record archive size, mtime and member CRCs in destination."""
+    stat = archive.stat()
+    manifest = {
+        "archive": archive.name,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "members": {
+            info.filename: [info.CRC, info.file_size]
+            for info in infos
+            if not info.is_dir()
+        },
+    }
+    (destination / MANIFEST_FILENAME).write_text(json.dumps(manifest))
+
+
+def _pending_members(
+    archive: Path, destination: Path, infos: list[ZipInfo]
+) -> list[ZipInfo]:
+    """Filter archive members that are missing or changed in destination.
+
+    Members are compared against the manifest of the previous extraction by CRC
+    and size, and against the extracted file by size. If the archive size and
+    mtime are unchanged, only the extracted files are checked.
+    """
+    manifest = _read_manifest(destination)
+    stat = archive.stat()
+    unchanged = (
+        manifest.get("size") == stat.st_size
+        and manifest.get("mtime_ns") == stat.st_mtime_ns
+    )
+    recorded = manifest.get("members", {})
+    pending = []
+    for info in infos:
+        if info.is_dir():
+            continue
+        target = destination / info.filename
+        if not unchanged and recorded.get(info.filename) != [info.CRC, info.file_size]:
+            pending.append(info)
+        elif not target.is_file() or target.stat().st_size != info.file_size:
+            pending.append(info)
+    return pending
+
+
+def _prune_stale(destination: Path, infos: list[ZipInfo]) -> int:
+    """Remove files in destination that are not members of the archive.
+
+    Members dropped from an archive since a previous extraction would otherwise
+    be indexed as responses. Returns the number of files removed.
+    """
+    members = {PurePosixPath(info.filename) for info in infos if not info.is_dir()}
+    removed = 0
+    for path in destination.rglob("*"):
+        if (
+            path.is_file()
+            and path.name != MANIFEST_FILENAME
+            and PurePosixPath(path.relative_to(destination).as_posix()) not in members
+        ):
+            LOG.debug(f"Removing {path}, no longer in archive.")
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def _batch_members(
+    archives: dict[Path, Path], batch_count: int, incremental: bool
+) -> list[tuple[Path, Path, list[str]]]:
+    """Split file members of each archive into up to batch_count batches.
+
+    Members are assigned largest first to the batch with the fewest bytes. If
+    incremental is set, members already extracted by a previous run are
+    skipped. Files that are not members of the archive are removed from its
+    destination. Directories for the members are created up front, so that
+    workers do not race on creating shared parents.
+    """
+    batches: list[tuple[Path, Path, list[str]]] = []
+    for archive, destination in archives.items():
+        destination.mkdir(parents=True, exist_ok=True)
+        with ZipFile(archive) as zip_file:
+            infos = zip_file.infolist()
+        _prune_stale(destination, infos)
+        if incremental:
+            files = _pending_members(archive, destination, infos)
+            LOG.debug(
+                f"{archive.name}: {len(files)} new or changed members to extract."
+            )
+        else:
+            files = [info for info in infos if not info.is_dir()]
+        for info in infos:
+            if info.is_dir():
+                (destination / info.filename).mkdir(parents=True, exist_ok=True)
+        for info in files:
+            (destination / info.filename).parent.mkdir(parents=True, exist_ok=True)
+        bins: list[tuple[int, list[str]]] = [
+            (0, []) for _ in range(min(batch_count, len(files)))
+        ]
+        for info in sorted(files, key=lambda info: info.file_size, reverse=True):
+            index = min(range(len(bins)), key=lambda i: bins[i][0])
+            bins[index][1].append(info.filename)
+            bins[index] = (bins[index][0] + info.file_size, bins[index][1])
+        batches.extend((archive, destination, names) for _, names in bins)
+    return batches
+
+
+def extract_archives(
+    archives: dict[Path, Path],
+    max_workers: int = 1,
+    use_processes: bool = False,
+    incremental: bool = True,
+) -> ExtractionStats:
+    """Extract archives to their destination directories.
+
+    Members of all archives are spread over a pool of max_workers threads, or
+    processes if use_processes is set, so that a single large archive is
+    extracted by several workers at once.
+
+    If incremental is set, each destination keeps a manifest of the archive
+    size, mtime and member CRCs, and only members that are missing or changed
+    since the last extraction are extracted again.
+    """
+    start = time.perf_counter()
+    batches = _batch_members(archives, max_workers * _BATCHES_PER_WORKER, incremental)
+    executor: Executor
+    if use_processes:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    with executor:
+        futures = [
+            executor.submit(_extract_members, archive, destination, names)
+            for archive, destination, names in batches
+        ]
+        size = sum(future.result() for future in futures)
+    for archive, destination in archives.items():
+        with ZipFile(archive) as zip_file:
+            _write_manifest(destination, archive, zip_file.infolist())
+    stats = ExtractionStats(
+        sum(len(names) for _, _, names in batches),
+        size,
+        time.perf_counter() - start,
+    )
+    LOG.info(f"Extracted {len(archives)} archives: {stats}")
+    return stats
@@ -2,20 +2,52 @@
 
 from __future__ import annotations
 
+import copy
+import heapq
 import logging
 from pathlib import Path
-from zipfile import ZipFile
+from typing import Any, Generator, Iterable, Iterator
 
+import numpy as np
 import pandas as pd
 from bidsi import BidsBuilder, BidsModel
 
+from .artifacts import (
+    ArtifactStore,
+    DirectoryArtifactStore,
+    ResponseArtifact,
+    ResponseArtifactIndex,
+    ZipArtifactStore,
+    read_csv_artifacts,
+)
+from .cache import CACHE_DIRNAME, PreprocessedCache
+from .content_store import ContentStore
+from .extraction import extract_archives
+from .instrumentation import stage
+from .ledger import ACTIVITIES_TASK, TaskKey, task_digests
 from .report_preprocessors import (
     CrashPreprocessor,
     DateTimePreprocessor,
+    FusedPreprocessor,
     ReportPreprocessor,
     StudyIdPreprocessor,
+    run_preprocessors,
+)
+from .schemas import (
+    ACTIVITY_USER_JOURNEY_DTYPES,
+    REPORT_DTYPES,
+    read_empty_export_csv,
+    read_export_csv,
+)
+from .streaming import iter_activity_blocks, iter_report_blocks
+from .transcode import TsvArtifact
+from .version_processors import (
+    DataVersionProcessor,
+    DefaultDataProcessor,
+    ReportResource,
+    parse_version,
+    select_processor,
 )
-from .version_processors import DataVersionProcessor, DefaultDataProcessor
 
 LOG = logging.getLogger(__name__)
 
@@ -24,9 +56,69 @@ ALL_REPORT_PREPROCESSORS: list[ReportPreprocessor] = [
     DateTimePreprocessor(),
     CrashPreprocessor(),
 ]
+# Single pass equivalent of ALL_REPORT_PREPROCESSORS, for large exports.
+FAST_REPORT_PREPROCESSORS: list[ReportPreprocessor] = [FusedPreprocessor()]
 ALL_VERSION_PROCESSORS: list[DataVersionProcessor] = [DefaultDataProcessor()]
 
 
+class _EntityBuffer:
+    """Stand-in for BidsBuilder collecting the entities added by processors."""
+
+    def __init__(self) -> None:
+        """Initialize empty buffer."""
+        self._entities: list[dict[str, Any]] = []
+
+    def add(self, **entity: Any) -> _EntityBuffer:  # noqa: ANN401
+        """Buffer entity."""
+        self._entities.append(entity)
+        return self
+
+    def drain(self) -> list[dict[str, Any]]:
+        """Return buffered entities and empty the buffer."""
+        entities, self._entities = self._entities, []
+        return entities
+
+
+def _is_file_response(response: str) -> bool:
+    """Whether report response names a response file, rather than a value."""
+    return not response.startswith("value:")
+
+
+class _LazyResource:
+    """Report response parsed only when its entity is yielded.
+
+    Implements the LazyResource protocol of version processors.
+    """
+
+    def __init__(
+        self,
+        report: GraphomotorReport,
+        response: str,
+        defer_paths: bool,
+        transcode_csv: bool,
+        content_store: ContentStore | None = None,
+    ) -> None:
+        """Initialize lazy resource of report response."""
+        self._report = report
+        self._response = response
+        self._defer_paths = defer_paths
+        self._transcode_csv = transcode_csv
+        self._content_store = content_store
+
+    def load(self) -> pd.DataFrame | Path:
+        """Parse response."""
+        with stage(
+            "parse_response", rows=1, files=int(_is_file_response(self._response))
+        ):
+            return self._report._parse_response(
+                self._response,
+                None,
+                self._defer_paths,
+                self._transcode_csv,
+                self._content_store,
+            )
+
+
 class GraphomotorReport:
     """Model of Graphomotor report data and import/export methods."""
 
@@ -49,173 +141,716 @@ class GraphomotorReport:
         data_directory: Path,
         activity_user_journey: pd.DataFrame,
         report: pd.DataFrame,
-        drawing_dir: Path,
-        media_dir: Path,
-        trails_dir: Path,
+        drawing_responses: ArtifactStore,
+        media_responses: ArtifactStore,
+        trails_responses: ArtifactStore,
         preprocessors: list[ReportPreprocessor] = ALL_REPORT_PREPROCESSORS,
         version_processors: list[DataVersionProcessor] = ALL_VERSION_PROCESSORS,
+        artifact_index: ResponseArtifactIndex | None = None,
+        cache: PreprocessedCache | None = None,
     ) -> None:
-        """Initialize Graphomotor report."""
+        """Initialize Graphomotor report.
+
+        An artifact_index of the response stores may be passed to share it
+        between reports of the same export. If a cache is passed, preprocessed
+        frames are stored in it.
+        """
+        self._stores = (drawing_responses, media_responses, trails_responses)
         self._data_directory = data_directory
         self._activity_user_journey = activity_user_journey
         self._report = report
-        self._drawing_dir = drawing_dir
-        self._drawings = list(self._drawing_dir.glob("*"))
-        self._media_dir = media_dir
-        self._media = list(self._media_dir.glob("*"))
-        self._trails_dir = trails_dir
-        self._trails = list(self._trails_dir.glob("*"))
+        self._artifacts = artifact_index or self._index_response_stores(
+            drawing_responses, media_responses, trails_responses
+        )
         self._preprocessors = preprocessors
         self._version_processors = version_processors
         self._preprocessed = False
+        self._cache = cache
+        self._deferred_artifacts: dict[Path, ResponseArtifact] = {}
+        self.response_load_times: dict[str, float] = {}
+
+    @property
+    def deferred_artifacts(self) -> dict[Path, ResponseArtifact]:
+        """Artifacts of deferred resource paths, to be passed to passthrough_copies."""
+        return self._deferred_artifacts
+
+    def close(self) -> None:
+        """Close response stores, e.g. their open zip archives."""
+        for store in self._stores:
+            store.close()
 
-    def _find_response_artifact_path(self, response: str) -> Path:
-        """Find Path to response artifact."""
+    @classmethod
+    def _index_response_stores(
+        cls,
+        drawing_responses: ArtifactStore,
+        media_responses: ArtifactStore,
+        trails_responses: ArtifactStore,
+    ) -> ResponseArtifactIndex:
+        """Index artifacts of response stores."""
+        return ResponseArtifactIndex.from_stores(
+            {
+                "media": media_responses,
+                "drawing": drawing_responses,
+                "trails": trails_responses,
+            }
+        )
+
+    def __len__(self) -> int:
+        """Number of rows in report."""
+        return len(self._report)
+
+    def _find_response_artifact(self, response: str) -> ResponseArtifact:
+        """Find response artifact."""
         media_responses = self._search_media(response)
         drawing_responses = self._search_drawings(response)
         trails_responses = self._search_trails(response)
         if len(media_responses) + len(drawing_responses) + len(trails_responses) > 1:
             raise ValueError(
-                f"{self.__class__}::_find_response_artifact_path: "
-                "Multiple responses found in different zip files: {response}"
+                f"{self.__class__}::_find_response_artifact: "
+                f"Multiple responses found in different zip files: {response}"
             )
         if media_responses:
             if len(media_responses) > 1:
                 raise ValueError(
                     f"{self.__class__}::_find_response_artifact: "
-                    "Multiple media responses found: {response}"
+                    f"Multiple media responses found: {response}"
                 )
-            return Path(media_responses[0])
+            return media_responses[0]
         if drawing_responses:
             if len(drawing_responses) > 1:
                 raise ValueError(
                     f"{self.__class__}::_find_response_artifact: "
-                    "Multiple drawing responses found: {response}"
+                    f"Multiple drawing responses found: {response}"
                 )
-            return Path(drawing_responses[0])
+            return drawing_responses[0]
         if trails_responses:
             if len(trails_responses) > 1:
                 raise ValueError(
                     f"{self.__class__}::_find_response_artifact: "
-                    "Multiple trails responses found: {response}"
+                    f"Multiple trails responses found: {response}"
                 )
-            return Path(trails_responses[0])
+            return trails_responses[0]
         raise ValueError(
-            f"{self.__class__}::_find_response_artifact_path: "
-            f"No responses found: {response}"
+            f"{self.__class__}::_find_response_artifact: No responses found: {response}"
         )
 
-    def _search_media(self, search: str) -> list[Path]:
+    def _search_media(self, search: str) -> list[ResponseArtifact]:
         """Filter media files matching search string."""
-        return [file for file in self._media_dir.iterdir() if file.match(search)]
+        return self._artifacts.search("media", search)
 
-    def _search_drawings(self, search: str) -> list[Path]:
+    def _search_drawings(self, search: str) -> list[ResponseArtifact]:
         """Filter drawing files matching search string."""
-        return [file for file in self._drawing_dir.iterdir() if file.match(search)]
+        return self._artifacts.search("drawing", search)
 
-    def _search_trails(self, search: str) -> list[Path]:
+    def _search_trails(self, search: str) -> list[ResponseArtifact]:
         """Filter trail files matching search string."""
-        return [file for file in self._trails_dir.iterdir() if file.match(search)]
+        return self._artifacts.search("trails", search)
 
-    def _parse_response(self, response: str) -> pd.DataFrame | Path:
-        """Parse resource string to Path."""
+    def _load_csv_responses(
+        self,
+        max_workers: int = 1,
+        use_processes: bool = False,
+        responses: Iterable[str] | None = None,
+    ) -> dict[str, pd.DataFrame]:
+        """Read CSV responses referenced by the report ahead of time.
+
+        Only CSV files among responses are read, if given. Seconds spent
+        reading each response are kept in response_load_times.
+        """
+        if responses is None:
+            responses = self._report.response
+        responses = [
+            response
+            for response in dict.fromkeys(responses)
+            if isinstance(response, str)
+            and not response.startswith("value:")
+            and response.endswith(".csv")
+        ]
+        LOG.debug(f"Loading {len(responses)} CSV responses.")
+        with stage("load_csv_responses", files=len(responses)):
+            loaded = read_csv_artifacts(
+                [self._find_response_artifact(response) for response in responses],
+                max_workers=max_workers,
+                use_processes=use_processes,
+            )
+        self.response_load_times = {
+            response: seconds for response, (_, seconds) in zip(responses, loaded)
+        }
+        return {response: frame for response, (frame, _) in zip(responses, loaded)}
+
+    def _parse_response(
+        self,
+        response: str,
+        csv_responses: dict[str, pd.DataFrame] | None = None,
+        defer_paths: bool = False,
+        transcode_csv: bool = False,
+        content_store: ContentStore | None = None,
+    ) -> pd.DataFrame | Path:
+        """Parse resource string to Path.
+
+        CSV responses already loaded in csv_responses are not read again. If
+        defer_paths is set, file responses are not extracted, and their paths
+        must be written through passthrough_copies. If transcode_csv is also
+        set, CSV responses are not read either, but transcoded to TSV files
+        when written. If a content_store is given, file responses and
+        transcoded CSV responses are placed in it and its paths returned
+        instead.
+        """
         # If response is a value, return a DataFrame with the value
         if response.startswith("value:"):
             LOG.debug(f"_parse_response: parsing value: {response}")
             return pd.DataFrame([response.split(":")[1].strip()], columns=["value"])
         # If response is a CSV file, read so that it is converted to TSV
         elif response.endswith(".csv"):
+            if defer_paths and transcode_csv:
+                LOG.debug(f"_parse_response: Transcoding CSV: {response}")
+                tsv_artifact = TsvArtifact(self._find_response_artifact(response))
+                if content_store is not None:
+                    return content_store.add(tsv_artifact)
+                return self._defer(tsv_artifact)
+            if csv_responses is not None and response in csv_responses:
+                return csv_responses[response]
             LOG.debug(f"_parse_response: Reading CSV: {response}")
-            return pd.read_csv(
-                self._data_directory / self._find_response_artifact_path(response)
-            )
+            with self._find_response_artifact(response).open() as csv_file:
+                return pd.read_csv(csv_file)
         # If response is a different filetype, return the file path
         LOG.debug(f"_parse_response: Returning file path: {response}")
-        return self._data_directory / self._find_response_artifact_path(response)
-
-    def bids_model(self) -> BidsModel:
-        """Construct BIDS Model from current data model."""
-        if not self._preprocessed:
-            LOG.info(
-                "Running preprocessors: "
-                f"{[p.__class__.__name__ for p in self._preprocessors]}"
+        artifact = self._find_response_artifact(response)
+        if content_store is not None:
+            return content_store.add(artifact)
+        return self._defer(artifact) if defer_paths else artifact.path()
+
+    def _defer(self, artifact: ResponseArtifact) -> Path:
+        """Deferred path of artifact, recording the artifact by its path."""
+        path = artifact.deferred_path()
+        self._deferred_artifacts[path] = artifact
+        return path
+
+    def preprocess(self) -> None:
+        """Run preprocessors on report and activities, unless already done.
+
+        Preprocessed frames are stored in the preprocessed cache, if set.
+        """
+        if self._preprocessed:
+            return
+        LOG.info(
+            "Running preprocessors: "
+            f"{[p.__class__.__name__ for p in self._preprocessors]}"
+        )
+        self._report, self._activity_user_journey = run_preprocessors(
+            self._preprocessors, self._report, self._activity_user_journey
+        )
+        self._preprocessed = True
+        if self._cache is not None:
+            self._cache.store(self._report, self._activity_user_journey)
+
+    def split_subjects(self, shards: int) -> list[GraphomotorReport]:
+        """Split preprocessed report into at most shards reports of whole subjects.
+
+        Report rows and activities are partitioned by study_id, and subjects are
+        assigned, largest first, to the shard with the fewest rows so far. Shards
+        keep the row order of the report, share its artifact index and are
+        already preprocessed, so they can be converted independently, e.g. on
+        worker processes.
+        """
+        self.preprocess()
+        sizes = (
+            self._report.study_id.value_counts()
+            .add(self._activity_user_journey.study_id.value_counts(), fill_value=0)
+            .sort_values(ascending=False, kind="stable")
+        )
+        shards = max(1, min(shards, len(sizes)))
+        loads = [(0, shard) for shard in range(shards)]
+        subject_shards: dict[str, int] = {}
+        for study_id, size in sizes.items():
+            load, shard = heapq.heappop(loads)
+            subject_shards[study_id] = shard
+            heapq.heappush(loads, (load + size, shard))
+
+        report_shards = self._report.study_id.map(subject_shards).fillna(0)
+        activity_shards = self._activity_user_journey.study_id.map(
+            subject_shards
+        ).fillna(0)
+        reports = [
+            self._subset(
+                (report_shards == shard).to_numpy(),
+                (activity_shards == shard).to_numpy(),
+            )
+            for shard in range(shards)
+        ]
+        LOG.debug(f"Split {len(sizes)} subjects into {shards} shards.")
+        return reports
+
+    def task_digests(self) -> dict[TaskKey, str]:
+        """Digest the source rows and artifacts of each subject and task.
+
+        Report rows belong to the task of their item, and activities to the
+        activities task. Digests of rows with file responses cover the content
+        key of their artifact, so that changed files change the digest.
+        """
+        self.preprocess()
+        with stage("task_digests", rows=len(self._report)):
+            artifact_keys = [
+                self._artifact_key(response) for response in self._report.response
+            ]
+            digests = task_digests(
+                self._report.assign(artifact_key=artifact_keys), self._report.item
+            )
+            digests.update(task_digests(self._activity_user_journey, ACTIVITIES_TASK))
+        return digests
+
+    def _artifact_key(self, response: object) -> str:
+        """Content key of the artifact of a file response, empty for values."""
+        if not isinstance(response, str) or response.startswith("value:"):
+            return ""
+        try:
+            return self._find_response_artifact(response).content_key()
+        except ValueError:
+            # Reported when the response is converted.
+            return ""
+
+    def select_tasks(self, tasks: Iterable[TaskKey]) -> GraphomotorReport:
+        """Preprocessed report of only the rows of the given subjects and tasks."""
+        self.preprocess()
+        tasks = set(tasks)
+        report_tasks = pd.MultiIndex.from_arrays(
+            [self._report.study_id.astype(str), self._report.item.astype(str)]
+        )
+        activity_subjects = {
+            subject for subject, task in tasks if task == ACTIVITIES_TASK
+        }
+        return self._subset(
+            report_tasks.isin(tasks),
+            self._activity_user_journey.study_id.astype(str)
+            .isin(activity_subjects)
+            .to_numpy(),
+        )
+
+    def iter_subjects(self) -> Iterator[GraphomotorReport]:
+        """Yield preprocessed reports of each subject, in order of first row.
+
+        Subject reports share the artifact index and the deferred artifacts
+        of this report, so that they are written with its deferred_artifacts.
+        """
+        self.preprocess()
+        report_rows = self._report.groupby("study_id", sort=False, dropna=False).indices
+        activity_rows = self._activity_user_journey.groupby(
+            "study_id", sort=False
+        ).indices
+        no_rows = np.array([], dtype=np.intp)
+        for study_id in dict.fromkeys([*report_rows, *activity_rows]):
+            subject = self._subset(
+                report_rows.get(study_id, no_rows),
+                activity_rows.get(study_id, no_rows),
+            )
+            subject._deferred_artifacts = self._deferred_artifacts
+            yield subject
+
+    def _subset(
+        self, report_rows: np.ndarray, activity_rows: np.ndarray
+    ) -> GraphomotorReport:
+        """Preprocessed report of rows, sharing the artifact index.
+
+        Rows are selected by boolean masks or positions.
+        """
+        report = copy.copy(self)
+        report._report = self._report.iloc[report_rows]
+        report._activity_user_journey = self._activity_user_journey.iloc[activity_rows]
+        report._cache = None
+        report._deferred_artifacts = {}
+        return report
+
+    def bids_entities(
+        self,
+        load_workers: int = 1,
+        load_processes: bool = False,
+        stream_artifacts: bool = False,
+        transcode_csv: bool = False,
+        content_store: ContentStore | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """Yield BIDS entities of current data model, as passed to BidsBuilder.add.
+
+        CSV responses are read up front by load_workers threads, or processes if
+        load_processes is set. If stream_artifacts is set, file responses are
+        left in their zips, to be streamed to the BIDS tree when the model is
+        written within passthrough_copies. If transcode_csv is also set, CSV
+        responses of processors that do not read them are transcoded to TSV
+        when written, instead of being read into DataFrames. If a content_store
+        is given, file responses are resources in the store, written to it only
+        if not stored by an earlier conversion.
+        """
+        self.preprocess()
+
+        builder = _EntityBuffer()
+        processor_rows, transcode = self._processor_rows(
+            stream_artifacts, transcode_csv
+        )
+        csv_responses = self._load_csv_responses(
+            load_workers, load_processes, self._report.response[~transcode]
+        )
+        with stage(
+            "parse_response",
+            rows=len(self._report),
+            files=sum(map(_is_file_response, self._report.response)),
+        ):
+            resources = [
+                self._parse_response(
+                    response,
+                    csv_responses,
+                    stream_artifacts,
+                    transcode_row,
+                    content_store,
+                )
+                for response, transcode_row in zip(self._report.response, transcode)
+            ]
+        for processor, positions in processor_rows:
+            with stage(
+                f"version_processor.{processor.__class__.__name__}",
+                rows=len(positions),
+            ):
+                processor.process_report_frame(
+                    self._report.iloc[positions],
+                    [resources[position] for position in positions],
+                    builder,
+                )
+            yield from builder.drain()
+        yield from self._activity_entities(builder)
+
+    def iter_bids_entities(
+        self,
+        stream_artifacts: bool = False,
+        transcode_csv: bool = False,
+        content_store: ContentStore | None = None,
+        block_rows: int = 1024,
+    ) -> Iterator[dict[str, Any]]:
+        """Yield BIDS entities one at a time, loading each resource when yielded.
+
+        Unlike bids_entities, responses are not read ahead: each resource is
+        parsed just before its entity is yielded, and only referenced by that
+        entity, so memory stays flat when entities are dropped after writing.
+        Report rows are passed to processors in blocks of block_rows rows.
+        Resources of processors that read CSV resources are parsed for each
+        block up front. Options are as for bids_entities.
+        """
+        self.preprocess()
+
+        builder = _EntityBuffer()
+        processor_rows, transcode = self._processor_rows(
+            stream_artifacts, transcode_csv
+        )
+        responses = self._report.response
+        for processor, positions in processor_rows:
+            for start in range(0, len(positions), block_rows):
+                block = positions[start : start + block_rows]
+                lazy_resources = [
+                    _LazyResource(
+                        self,
+                        responses.iat[position],
+                        stream_artifacts,
+                        transcode[position],
+                        content_store,
+                    )
+                    for position in block
+                ]
+                resources: list[ReportResource] = (
+                    [resource.load() for resource in lazy_resources]
+                    if processor.READS_CSV_RESOURCES
+                    else list(lazy_resources)
+                )
+                with stage(
+                    f"version_processor.{processor.__class__.__name__}",
+                    rows=len(block),
+                ):
+                    processor.process_report_frame(
+                        self._report.iloc[block], resources, builder
+                    )
+                del resources, lazy_resources
+                entities = builder.drain()
+                entities.reverse()
+                while entities:
+                    entity = entities.pop()
+                    if isinstance(entity.get("resource"), _LazyResource):
+                        entity["resource"] = entity["resource"].load()
+                    yield entity
+        yield from self._activity_entities(builder)
+
+    def _processor_rows(
+        self, stream_artifacts: bool, transcode_csv: bool
+    ) -> tuple[list[tuple[DataVersionProcessor, np.ndarray]], np.ndarray]:
+        """Report row positions of each version processor, and rows to transcode."""
+        # Assign each distinct version to a processor once, then dispatch the
+        # rows of each processor together.
+        codes, versions = pd.factorize(self._report.version, use_na_sentinel=False)
+        version_processors = [
+            select_processor(self._version_processors, [parse_version(version)])
+            for version in versions
+        ]
+        transcode = np.zeros(len(self._report), dtype=bool)
+        if stream_artifacts and transcode_csv:
+            transcode = ~np.array(
+                [
+                    processor is not None and processor.READS_CSV_RESOURCES
+                    for processor in version_processors
+                ],
+                dtype=bool,
+            )[codes]
+        processor_rows = []
+        for processor in self._version_processors:
+            positions = np.flatnonzero(
+                np.isin(
+                    codes,
+                    [
+                        code
+                        for code, selected in enumerate(version_processors)
+                        if selected is processor
+                    ],
+                )
             )
-            for preprocessor in self._preprocessors:
-                self._report, self._activity_user_journey = preprocessor(
-                    self._report, self._activity_user_journey
+            if len(positions):
+                processor_rows.append((processor, positions))
+        return processor_rows, transcode
+
+    def _activity_entities(self, builder: _EntityBuffer) -> Iterator[dict[str, Any]]:
+        """Yield BIDS entities of activities, one study at a time."""
+        for study_id, activities in self._activity_user_journey.groupby("study_id"):
+            with stage("process_activities", rows=len(activities)):
+                activity_processor = select_processor(
+                    self._version_processors,
+                    [parse_version(version) for version in activities.version.unique()],
                 )
-            self._preprocessed = True
+                if activity_processor is not None:
+                    activity_processor.process_activities(study_id, activities, builder)
+            yield from builder.drain()
+
+    def bids_model(
+        self,
+        load_workers: int = 1,
+        load_processes: bool = False,
+        stream_artifacts: bool = False,
+        transcode_csv: bool = False,
+        content_store: ContentStore | None = None,
+    ) -> BidsModel:
+        """Construct BIDS Model from current data model.
 
-        # Construct BIDS model
+        Options are as for bids_entities.
+        """
         builder = BidsBuilder()
-        for row in self._report.itertuples(name="Row"):
-            resource = self._parse_response(row.response)
-            for processor in self._version_processors:
-                if processor.check_version(row.version):
-                    builder = processor.process_report_row(row, resource, builder)
-                    break
-        for study_id, activities in self._activity_user_journey.groupby("study_id"):
-            for processor in self._version_processors:
-                if processor.check_version(activities.version):
-                    builder = processor.process_activities(
-                        study_id, activities, builder
-                    )
-                    break
+        for entity in self.bids_entities(
+            load_workers, load_processes, stream_artifacts, transcode_csv, content_store
+        ):
+            builder.add(**entity)
         return builder.build()
 
     @classmethod
-    def create(cls, data_directory: Path) -> GraphomotorReport:
-        """Collect files from data directory."""
+    def is_export(cls, data_directory: Path, require_responses: bool = False) -> bool:
+        """Check if directory contains the report files of an export.
+
+        If require_responses is set, the three response zips must exist too.
+        """
+        return len(cls.export_files(data_directory, require_responses)) == (
+            5 if require_responses else 2
+        )
+
+    @classmethod
+    def export_files(
+        cls, data_directory: Path, include_responses: bool = True
+    ) -> list[Path]:
+        """List the input files of an export that exist in data directory."""
+        files = [
+            data_directory / cls._REPORT_FILENAME,
+            data_directory / cls._ACTIVITY_USER_JOURNEY_FILENAME,
+        ]
+        if include_responses:
+            for pattern in (
+                cls._DRAWING_RESPONSES_PATTERN,
+                cls._MEDIA_RESPONSES_PATTERN,
+                cls._TRAILS_RESPONSES_PATTERN,
+            ):
+                files.extend(sorted(data_directory.glob(pattern))[:1])
+        return [path for path in files if path.is_file()]
+
+    @classmethod
+    def create(
+        cls,
+        data_directory: Path,
+        extract: bool = False,
+        extract_workers: int = 1,
+        extract_processes: bool = False,
+        cache: bool = False,
+        preprocessors: list[ReportPreprocessor] = ALL_REPORT_PREPROCESSORS,
+    ) -> GraphomotorReport:
+        """Collect files from data directory.
+
+        Response zips are read on demand unless extract is set, in which case
+        they are fully extracted up front by extract_workers threads, or
+        processes if extract_processes is set.
+
+        If cache is set, preprocessed frames are loaded from, or stored in, a
+        Parquet cache in the data directory. Preprocessors may be set to
+        FAST_REPORT_PREPROCESSORS for large exports.
+        """
+        with stage("create", files=2) as counter:
+            activity_path, report_path = cls._find_report_files(data_directory)
+            preprocessed_cache = None
+            cached = None
+            if cache:
+                preprocessed_cache = PreprocessedCache(
+                    data_directory / CACHE_DIRNAME,
+                    [report_path, activity_path],
+                    preprocessors,
+                )
+                cached = preprocessed_cache.load()
+            if cached is not None:
+                report, activity_user_journey = cached
+            else:
+                activity_user_journey = read_export_csv(
+                    activity_path, ACTIVITY_USER_JOURNEY_DTYPES
+                )
+                # activity_user_journey.fillna("", inplace=True)
+                report = read_export_csv(report_path, REPORT_DTYPES)
+                # report.fillna("", inplace=True)
+
+            graphomotor_report = cls(
+                data_directory,
+                activity_user_journey,
+                report,
+                *cls._open_response_stores(
+                    data_directory, extract, extract_workers, extract_processes
+                ),
+                preprocessors=preprocessors,
+                cache=preprocessed_cache,
+            )
+            counter.rows = len(report)
+        graphomotor_report._preprocessed = cached is not None
+        return graphomotor_report
+
+    @classmethod
+    def stream(
+        cls,
+        data_directory: Path,
+        chunksize: int | None = None,
+        extract: bool = False,
+        extract_workers: int = 1,
+        extract_processes: bool = False,
+        cache: bool = False,
+        preprocessors: list[ReportPreprocessor] = ALL_REPORT_PREPROCESSORS,
+    ) -> Generator[GraphomotorReport, None, None]:
+        """Collect files from data directory as a stream of partial reports.
+
+        If chunksize is None, yields the single report returned by create.
+        Otherwise, report.csv and activity_user_journey.csv are read in chunks
+        of about chunksize rows and split at study boundaries, yielding reports
+        holding either report rows or activities of whole subjects, so that
+        subjects coming back later in a file are written in a single model.
+        Response artifacts are indexed once and shared. The preprocessed cache
+        is only used without a chunksize. Response stores are closed when the
+        stream is exhausted or closed.
+        """
+        if chunksize is None:
+            report = cls.create(
+                data_directory,
+                extract,
+                extract_workers,
+                extract_processes,
+                cache,
+                preprocessors,
+            )
+            try:
+                yield report
+            finally:
+                report.close()
+            return
+        if cache:
+            LOG.warning("Preprocessed cache is not used when reading in chunks.")
+
+        activity_path, report_path = cls._find_report_files(data_directory)
+        stores = cls._open_response_stores(
+            data_directory, extract, extract_workers, extract_processes
+        )
+        artifact_index = cls._index_response_stores(*stores)
+        empty_activity = read_empty_export_csv(
+            activity_path, ACTIVITY_USER_JOURNEY_DTYPES
+        )
+        empty_report = read_empty_export_csv(report_path, REPORT_DTYPES)
+        try:
+            for report in iter_report_blocks(report_path, chunksize):
+                yield cls(
+                    data_directory,
+                    empty_activity.copy(),
+                    report,
+                    *stores,
+                    preprocessors=preprocessors,
+                    artifact_index=artifact_index,
+                )
+            for activity in iter_activity_blocks(activity_path, chunksize):
+                yield cls(
+                    data_directory,
+                    activity,
+                    empty_report.copy(),
+                    *stores,
+                    preprocessors=preprocessors,
+                    artifact_index=artifact_index,
+                )
+        finally:
+            for store in stores:
+                store.close()
+
+    @classmethod
+    def _find_report_files(cls, data_directory: Path) -> tuple[Path, Path]:
+        """Find activity_user_journey.csv and report.csv in data directory."""
         if not data_directory.is_dir():
             raise FileNotFoundError(f"Directory {data_directory} does not exist.")
 
         activity_path = data_directory / cls._ACTIVITY_USER_JOURNEY_FILENAME
         if not activity_path.is_file():
             raise FileNotFoundError(f"File {activity_path} does not exist.")
-        activity_user_journey = pd.read_csv(activity_path)
-        # activity_user_journey.fillna("", inplace=True)
 
         report_path = data_directory / cls._REPORT_FILENAME
         if not report_path.is_file():
             raise FileNotFoundError(f"File {report_path} does not exist.")
-        report = pd.read_csv(report_path)
-        # report.fillna("", inplace=True)
+        return activity_path, report_path
 
-        try:
-            drawing_responses_path = next(
-                data_directory.glob(cls._DRAWING_RESPONSES_PATTERN)
+    @classmethod
+    def _open_response_stores(
+        cls,
+        data_directory: Path,
+        extract: bool,
+        extract_workers: int,
+        extract_processes: bool,
+    ) -> tuple[ArtifactStore, ArtifactStore, ArtifactStore]:
+        """Open drawing, media and trails response zips as artifact stores."""
+        response_archives = [
+            cls._find_responses(data_directory, pattern)
+            for pattern in (
+                cls._DRAWING_RESPONSES_PATTERN,
+                cls._MEDIA_RESPONSES_PATTERN,
+                cls._TRAILS_RESPONSES_PATTERN,
             )
-        except StopIteration:
-            raise FileNotFoundError(f"File {drawing_responses_path} does not exist.")
-        drawing_responses_dir = drawing_responses_path.with_suffix("")
-        drawing_responses_dir.mkdir(exist_ok=True)
-        ZipFile(drawing_responses_path).extractall(drawing_responses_dir)
-
-        try:
-            media_responses_path = next(
-                data_directory.glob(cls._MEDIA_RESPONSES_PATTERN)
+        ]
+        drawing, media, trails = response_archives
+        if not extract:
+            return (
+                ZipArtifactStore(drawing, drawing.with_suffix("")),
+                ZipArtifactStore(media, media.with_suffix("")),
+                ZipArtifactStore(trails, trails.with_suffix("")),
             )
-        except StopIteration:
-            raise FileNotFoundError(f"File {media_responses_path} does not exist.")
-        media_responses_dir = media_responses_path.with_suffix("")
-        media_responses_dir.mkdir(exist_ok=True)
-        ZipFile(media_responses_path).extractall(media_responses_dir)
+        extract_archives(
+            {path: path.with_suffix("") for path in response_archives},
+            max_workers=extract_workers,
+            use_processes=extract_processes,
+        )
+        return (
+            DirectoryArtifactStore(drawing.with_suffix("")),
+            DirectoryArtifactStore(media.with_suffix("")),
+            DirectoryArtifactStore(trails.with_suffix("")),
+        )
 
+    @staticmethod
+    def _find_responses(data_directory: Path, pattern: str) -> Path:
+        """Find response zip matching pattern in data directory."""
         try:
-            trails_responses_path = next(
-                data_directory.glob(cls._TRAILS_RESPONSES_PATTERN)
-            )
+            return next(data_directory.glob(pattern))
         except StopIteration:
-            raise FileNotFoundError(f"File {trails_responses_path} does not exist.")
-        trails_responses_dir = trails_responses_path.with_suffix("")
-        trails_responses_dir.mkdir(exist_ok=True)
-        ZipFile(trails_responses_path).extractall(trails_responses_dir)
-
-        return cls(
-            data_directory,
-            activity_user_journey,
-            report,
-            drawing_responses_dir,
-            media_responses_dir,
-            trails_responses_dir,
-        )
+            raise FileNotFoundError(
+                f"File matching {data_directory / pattern} does not exist."
+            )
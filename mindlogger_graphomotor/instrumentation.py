@@ -0,0 +1,207 @@
+"""Per-stage timing and resource metrics of conversions."""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+LOG = logging.getLogger(__name__)
+
+try:
+    import resource
+
+    HAS_RESOURCE = True
+except ImportError:
+    HAS_RESOURCE = False
+
+METRIC_PREFIX = "graphomotor_stage"
+
+
+def process_peak_rss_bytes() -> int:
+    """Peak resident set size of this process since it started, or 0."""
+    if not HAS_RESOURCE:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageMetrics:
+    """Accumulated metrics of a stage.
+
+    CPU time is of the whole process, including other threads, while the stage
+    runs. Process peak RSS is the high-water mark of the process since it
+    started, read at the end of the stage, so it includes earlier stages.
+    """
+
+    def __init__(self, name: str) -> None:
+        """Initialize empty metrics of stage."""
+        self.name = name
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.process_peak_rss_bytes = 0
+        self.rows = 0
+        self.files = 0
+
+    def merge(self, other: StageMetrics) -> None:
+        """Add metrics of other to these metrics."""
+        self.calls += other.calls
+        self.wall_seconds += other.wall_seconds
+        self.cpu_seconds += other.cpu_seconds
+        self.process_peak_rss_bytes = max(
+            self.process_peak_rss_bytes, other.process_peak_rss_bytes
+        )
+        self.rows += other.rows
+        self.files += other.files
+
+    def to_dict(self) -> dict:
+        """Metrics as a JSON serializable dict."""
+        return {
+            "calls": self.calls,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "process_peak_rss_bytes": self.process_peak_rss_bytes,
+            "rows": self.rows,
+            "files": self.files,
+        }
+
+    @classmethod
+    def from_dict(cls, name: str, values: dict) -> StageMetrics:
+        """Metrics of stage from dict returned by to_dict."""
+        metrics = cls(name)
+        for key, value in values.items():
+            setattr(metrics, key, value)
+        return metrics
+
+
+class StageCounter:
+    """Counts of rows and files processed by a running stage."""
+
+    def __init__(self, rows: int = 0, files: int = 0) -> None:
+        """Initialize counts."""
+        self.rows = rows
+        self.files = files
+
+
+class Instrumentation:
+    """Metrics of named stages, exportable as JSON and Prometheus text format."""
+
+    # (metric suffix, StageMetrics attribute, type, help)
+    _PROMETHEUS_METRICS = (
+        ("calls_total", "calls", "counter", "Number of times the stage ran."),
+        ("wall_seconds_total", "wall_seconds", "counter", "Wall time of stage."),
+        ("cpu_seconds_total", "cpu_seconds", "counter", "Process CPU time of stage."),
+        (
+            "process_peak_rss_bytes",
+            "process_peak_rss_bytes",
+            "gauge",
+            "Peak RSS of the process so far, after stage.",
+        ),
+        ("rows_total", "rows", "counter", "Report rows processed by stage."),
+        ("files_total", "files", "counter", "Files processed by stage."),
+    )
+
+    def __init__(self) -> None:
+        """Initialize empty instrumentation."""
+        self.stages: dict[str, StageMetrics] = {}
+        self._lock = threading.Lock()
+
+    def record(self, metrics: StageMetrics) -> None:
+        """Add metrics of a stage run."""
+        with self._lock:
+            if metrics.name not in self.stages:
+                self.stages[metrics.name] = StageMetrics(metrics.name)
+            self.stages[metrics.name].merge(metrics)
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0, files: int = 0) -> Iterator[StageCounter]:
+        """Measure the enclosed block as a run of stage.
+
+        Counts of rows and files may be updated on the yielded counter.
+        """
+        counter = StageCounter(rows, files)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield counter
+        finally:
+            metrics = StageMetrics(name)
+            metrics.calls = 1
+            metrics.wall_seconds = time.perf_counter() - wall_start
+            metrics.cpu_seconds = time.process_time() - cpu_start
+            metrics.process_peak_rss_bytes = process_peak_rss_bytes()
+            metrics.rows = counter.rows
+            metrics.files = counter.files
+            self.record(metrics)
+
+    def merge(self, stages: dict[str, dict]) -> None:
+        """Add metrics of stages returned by to_dict, e.g. from another process."""
+        for name, values in stages.items():
+            self.record(StageMetrics.from_dict(name, values))
+
+    def to_dict(self) -> dict[str, dict]:
+        """Metrics of all stages as a JSON serializable dict."""
+        with self._lock:
+            return {name: metrics.to_dict() for name, metrics in self.stages.items()}
+
+    def to_json(self) -> str:
+        """Metrics of all stages as JSON."""
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Metrics of all stages in Prometheus text exposition format."""
+        stages = self.to_dict()
+        lines = []
+        for suffix, key, metric_type, description in self._PROMETHEUS_METRICS:
+            name = f"{METRIC_PREFIX}_{suffix}"
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for stage, values in stages.items():
+                label = stage.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{name}{{stage="{label}"}} {values[key]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path) -> None:
+        """Write metrics to path, in Prometheus format if its suffix is .prom."""
+        text = self.to_prometheus() if path.suffix == ".prom" else self.to_json()
+        path.write_text(text)
+        LOG.info(f"Wrote stage metrics to {path}")
+
+
+# Instrumentation of the collecting block running in this context.
+_active: contextvars.ContextVar[Instrumentation | None] = contextvars.ContextVar(
+    "instrumentation", default=None
+)
+
+
+@contextmanager
+def collecting(instrumentation: Instrumentation) -> Iterator[Instrumentation]:
+    """Record stages of the enclosed block in instrumentation.
+
+    Stages running on threads started by asyncio.to_thread, which copies the
+    context, are recorded too, but not stages running on other threads.
+    """
+    token = _active.set(instrumentation)
+    try:
+        yield instrumentation
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def stage(name: str, rows: int = 0, files: int = 0) -> Iterator[StageCounter]:
+    """Measure the enclosed block as a run of stage, if collecting metrics."""
+    instrumentation = _active.get()
+    if instrumentation is None:
+        yield StageCounter(rows, files)
+        return
+    with instrumentation.stage(name, rows, files) as counter:
+        yield counter
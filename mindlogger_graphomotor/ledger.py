@@ -0,0 +1,139 @@
+"""Ledger of subjects and tasks already converted into a BIDS root."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+import pandas as pd
+
+LOG = logging.getLogger(__name__)
+
+LEDGER_FILENAME = ".graphomotor-ledger.json"
+# Task of the activities of a subject, as named by the version processors.
+ACTIVITIES_TASK = "activities"
+# Bump to reconvert everything when the digested content changes.
+_LEDGER_FORMAT_VERSION = 1
+
+TaskKey = tuple[str, str]
+
+
+def package_version() -> str:
+    """Installed version of this package, or "unknown" if not installed."""
+    try:
+        return version("mindlogger-graphomotor")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def conversion_settings(config: Path) -> str:
+    """Digest the package version and the BIDS config file of a conversion."""
+    digest = hashlib.blake2b(package_version().encode(), digest_size=16)
+    digest.update(config.read_bytes())
+    return digest.hexdigest()
+
+
+def task_digests(frame: pd.DataFrame, tasks: pd.Series | str) -> dict[TaskKey, str]:
+    """Digest the rows of each subject and task of frame.
+
+    Rows are grouped by study_id and tasks, a column aligned with frame or a
+    single task for all rows. Digests change with the values and order of the
+    rows of a task, but not with the rows of other tasks.
+    """
+    if frame.empty:
+        return {}
+    row_hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    if isinstance(tasks, pd.Series):
+        tasks = tasks.astype(str).to_numpy()
+    keys = pd.DataFrame(
+        {"study_id": frame["study_id"].astype(str).to_numpy(), "task": tasks}
+    )
+    groups = keys.groupby(["study_id", "task"], sort=False).indices
+    return {
+        key: hashlib.blake2b(row_hashes[rows].tobytes(), digest_size=16).hexdigest()
+        for key, rows in groups.items()
+    }
+
+
+class ConversionLedger:
+    """Digests of the source rows and artifacts of converted subjects and tasks.
+
+    The ledger is stored as JSON in the BIDS root. Tasks whose digest matches
+    the ledger were converted from the same inputs and settings before, and
+    need not be converted again. Settings, e.g. from conversion_settings, apply
+    to the whole ledger, so that changing them converts all tasks again.
+    Digests of converted tasks are recorded in memory and only saved once their
+    conversion succeeded.
+    """
+
+    def __init__(self, bids_root: Path, settings: str = "") -> None:
+        """Initialize ledger of BIDS root, reading it if present."""
+        self.path = bids_root / LEDGER_FILENAME
+        self.settings = settings
+        self._digests = self._read()
+        self._converted: dict[TaskKey, str] = {}
+
+    def _read(self) -> dict[TaskKey, str]:
+        """Read task digests from ledger file, if present and current."""
+        if not self.path.is_file():
+            return {}
+        try:
+            content = json.loads(self.path.read_text())
+        except (OSError, ValueError) as error:
+            LOG.warning(f"Ignoring unreadable ledger {self.path}: {error}")
+            return {}
+        if content.get("version") != _LEDGER_FORMAT_VERSION:
+            LOG.info(f"Ignoring ledger {self.path} of another format version.")
+            return {}
+        if content.get("settings") != self.settings:
+            LOG.info(f"Ignoring ledger {self.path} of other conversion settings.")
+            return {}
+        return {
+            (subject, task): digest
+            for subject, tasks in content.get("subjects", {}).items()
+            for task, digest in tasks.items()
+        }
+
+    def changed(self, digests: dict[TaskKey, str]) -> dict[TaskKey, str]:
+        """Digests of tasks that were not converted from the same inputs before."""
+        return {
+            key: digest
+            for key, digest in digests.items()
+            if self._digests.get(key) != digest
+        }
+
+    def record(self, digests: dict[TaskKey, str]) -> None:
+        """Record digests of converted tasks, to be written by save."""
+        self._converted.update(digests)
+
+    def save(self) -> None:
+        """Write recorded digests to the ledger file.
+
+        The file is read again before writing, so that tasks recorded by other
+        conversions in the meantime are kept; callers writing into a shared
+        BIDS root must hold its write lock. The file is replaced atomically.
+        """
+        if not self._converted:
+            return
+        self._digests = {**self._read(), **self._converted}
+        subjects: dict[str, dict[str, str]] = {}
+        for (subject, task), digest in sorted(self._digests.items()):
+            subjects.setdefault(subject, {})[task] = digest
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        temporary.write_text(
+            json.dumps(
+                {
+                    "version": _LEDGER_FORMAT_VERSION,
+                    "settings": self.settings,
+                    "subjects": subjects,
+                }
+            )
+        )
+        os.replace(temporary, self.path)
+        LOG.info(f"Recorded {len(self._converted)} converted tasks in {self.path}")
+        self._converted = {}
@@ -0,0 +1,270 @@
+"""Passthrough of response files into the BIDS tree without rewriting them."""
+
+from __future__ import annotations
+
+import collections
+import contextvars
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Mapping
+
+from .artifacts import FileArtifact, ResponseArtifact
+
+LOG = logging.getLogger(__name__)
+
+try:
+    import fcntl
+
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+PASSTHROUGH_MODES = ("hardlink", "reflink")
+# ioctl request cloning a whole file, _IOW(0x94, 9, int) in linux/fs.h.
+FICLONE = 0x40049409
+_COPY_CHUNK_SIZE = 2**30
+_STREAM_BUFFER_SIZE = 2**20
+
+_original_copyfile = shutil.copyfile
+_original_copymode = shutil.copymode
+_original_copystat = shutil.copystat
+# Copies of the passthrough_copies block running in this context.
+_active_copies: contextvars.ContextVar[_PassthroughCopies | None] = (
+    contextvars.ContextVar("passthrough_copies", default=None)
+)
+# Number of running passthrough_copies blocks, which hook shutil while above 0.
+_hook_users = 0
+_hook_lock = threading.Lock()
+
+
+def _unlink_destination(source: Path, destination: Path) -> None:
+    """Unlink destination before it is written, unless it is source.
+
+    Destination may be hard linked to a stored or extracted response file,
+    which writing destination in place would change too.
+    """
+    try:
+        if not os.path.samefile(source, destination):
+            destination.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _hardlink(source: Path, destination: Path) -> None:
+    """Hard link destination to source, replacing destination."""
+    destination.unlink(missing_ok=True)
+    os.link(source, destination)
+
+
+def _reflink(source: Path, destination: Path) -> None:
+    """Clone source to destination, sharing extents on copy-on-write filesystems."""
+    if not HAS_FCNTL:
+        raise OSError("fcntl not available.")
+    with source.open("rb") as source_file, destination.open("wb") as target_file:
+        try:
+            fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+        except OSError:
+            target_file.close()
+            destination.unlink(missing_ok=True)
+            raise
+
+
+def _copy_file_range(source: Path, destination: Path) -> None:
+    """Copy source to destination in the kernel, without user space buffers."""
+    if not hasattr(os, "copy_file_range"):
+        raise OSError("os.copy_file_range not available.")
+    with source.open("rb") as source_file, destination.open("wb") as target_file:
+        try:
+            while os.copy_file_range(
+                source_file.fileno(), target_file.fileno(), _COPY_CHUNK_SIZE
+            ):
+                pass
+        except OSError:
+            target_file.close()
+            destination.unlink(missing_ok=True)
+            raise
+
+
+def link_or_copy(source: Path, destination: Path, mode: str = "reflink") -> str:
+    """Place source at destination with the cheapest available method.
+
+    In hardlink mode, destination is hard linked to source, so both share one
+    inode and must not be modified afterwards. Otherwise, or if linking fails,
+    e.g. across filesystems, source is reflinked, copied with copy_file_range,
+    or copied through a buffer, in that order. An existing destination is
+    unlinked first, never written in place. Returns the method used.
+    """
+    if mode not in PASSTHROUGH_MODES:
+        raise ValueError(f"Unknown passthrough mode {mode!r}.")
+    _unlink_destination(source, destination)
+    methods = [("reflink", _reflink), ("copy_file_range", _copy_file_range)]
+    if mode == "hardlink":
+        methods.insert(0, ("hardlink", _hardlink))
+    for name, method in methods:
+        try:
+            method(source, destination)
+            return name
+        except OSError as error:
+            LOG.debug(f"{name} of {source} to {destination} failed: {error}")
+    _original_copyfile(source, destination)
+    return "copy"
+
+
+def stream_artifact(artifact: ResponseArtifact, destination: Path) -> None:
+    """Write artifact to destination, streaming it from its store.
+
+    Artifacts with a write_to method, e.g. transcoded ones, write themselves.
+    An existing destination is unlinked first, never written in place.
+    """
+    destination.unlink(missing_ok=True)
+    write_to = getattr(artifact, "write_to", None)
+    if write_to is not None:
+        write_to(destination)
+        return
+    with artifact.open() as source_file, destination.open("wb") as target_file:
+        shutil.copyfileobj(source_file, target_file, _STREAM_BUFFER_SIZE)
+
+
+class _PassthroughCopies:
+    """File copies of a passthrough_copies block."""
+
+    def __init__(
+        self, mode: str | None, deferred_artifacts: Mapping[Path, ResponseArtifact]
+    ) -> None:
+        """Initialize copies in mode, streaming deferred artifacts."""
+        self.mode = mode
+        self.deferred_artifacts = deferred_artifacts
+        self.methods: collections.Counter = collections.Counter()
+
+    def streamed(self, source: Path) -> ResponseArtifact | None:
+        """Deferred artifact to stream for copies of source, if any.
+
+        Artifacts that are files on disk are placed from there. Others are
+        streamed even if a file exists at source, which may be left from an
+        earlier export.
+        """
+        artifact = self.deferred_artifacts.get(source)
+        return None if isinstance(artifact, FileArtifact) else artifact
+
+    def copyfile(
+        self,
+        src: str | os.PathLike,
+        dst: str | os.PathLike,
+        *,
+        follow_symlinks: bool = True,
+    ) -> str | os.PathLike:
+        """Place src at dst, streaming deferred artifacts."""
+        source, destination = Path(src), Path(dst)
+        artifact = self.streamed(source)
+        if artifact is not None:
+            stream_artifact(artifact, destination)
+            self.methods["stream"] += 1
+            return dst
+        if self.mode is None:
+            self.methods["copy"] += 1
+            _unlink_destination(source, destination)
+            return _original_copyfile(src, dst, follow_symlinks=follow_symlinks)
+        if not follow_symlinks and source.is_symlink():
+            return _original_copyfile(src, dst, follow_symlinks=False)
+        if destination.exists() and os.path.samefile(source, destination):
+            # Hard linked by an earlier conversion.
+            self.methods["unchanged"] += 1
+            return dst
+        if destination.is_dir():
+            raise IsADirectoryError(f"Destination {destination} is a directory.")
+        self.methods[link_or_copy(source, destination, self.mode)] += 1
+        return dst
+
+
+def _copyfile(
+    src: str | os.PathLike, dst: str | os.PathLike, *, follow_symlinks: bool = True
+) -> str | os.PathLike:
+    """Copy with the passthrough_copies block of this context, if any."""
+    copies = _active_copies.get()
+    if copies is None:
+        return _original_copyfile(src, dst, follow_symlinks=follow_symlinks)
+    return copies.copyfile(src, dst, follow_symlinks=follow_symlinks)
+
+
+def _skip_streamed(copy_metadata: Callable) -> Callable:
+    """Wrap shutil metadata copy to skip sources streamed from deferred artifacts."""
+
+    def wrapper(
+        src: str | os.PathLike, dst: str | os.PathLike, *, follow_symlinks: bool = True
+    ) -> None:
+        copies = _active_copies.get()
+        if copies is not None and copies.streamed(Path(src)) is not None:
+            return
+        copy_metadata(src, dst, follow_symlinks=follow_symlinks)
+
+    return wrapper
+
+
+_HOOKS = {
+    "copyfile": _copyfile,
+    "copymode": _skip_streamed(_original_copymode),
+    "copystat": _skip_streamed(_original_copystat),
+}
+_ORIGINALS = {
+    "copyfile": _original_copyfile,
+    "copymode": _original_copymode,
+    "copystat": _original_copystat,
+}
+
+
+@contextmanager
+def _shutil_hooks() -> Iterator[None]:
+    """Hook shutil file copies while any passthrough_copies block runs."""
+    global _hook_users
+    with _hook_lock:
+        if not _hook_users:
+            for name, hook in _HOOKS.items():
+                setattr(shutil, name, hook)
+        _hook_users += 1
+    try:
+        yield
+    finally:
+        with _hook_lock:
+            _hook_users -= 1
+            if not _hook_users:
+                for name, original in _ORIGINALS.items():
+                    setattr(shutil, name, original)
+
+
+@contextmanager
+def passthrough_copies(
+    mode: str | None = "reflink",
+    deferred_artifacts: Mapping[Path, ResponseArtifact] | None = None,
+) -> Iterator[collections.Counter]:
+    """Route file copies of this context through link_or_copy while the block runs.
+
+    BidsWriter copies Path resources into the BIDS tree with shutil, so the
+    enclosed write places response files without reading and rewriting them.
+    Copies of the deferred paths in deferred_artifacts, e.g. those recorded
+    by GraphomotorReport, stream the artifact, e.g. a zip member, straight to
+    its destination. If mode is None, other files are copied as usual. Existing
+    destinations, which may be hard linked to stored or extracted response
+    files, are replaced rather than written in place. Yields a counter of the
+    methods used.
+
+    Only copies made in the context of the block are routed, including those
+    of asyncio tasks and asyncio.to_thread calls started within it, which copy
+    the context. Copies on other threads, e.g. concurrent conversions, are not
+    affected.
+    """
+    copies = _PassthroughCopies(mode, deferred_artifacts or {})
+    with _shutil_hooks():
+        token = _active_copies.set(copies)
+        try:
+            yield copies.methods
+        finally:
+            _active_copies.reset(token)
+    if copies.methods:
+        LOG.info(
+            f"Passed through {sum(copies.methods.values())} files: "
+            f"{dict(copies.methods)}"
+        )
@@ -0,0 +1,110 @@
+"""Asynchronous producer/consumer writing of BIDS models."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from contextlib import AbstractContextManager, nullcontext
+from pathlib import Path
+from typing import Any, Callable, Iterable, TypeVar
+
+from bidsi import BidsBuilder, BidsConfig, BidsWriter
+
+from .instrumentation import stage
+
+LOG = logging.getLogger(__name__)
+
+# Queued after the last model.
+_DONE = None
+
+T = TypeVar("T")
+
+
+def write_model(
+    entities: list[dict[str, Any]],
+    bids_root: Path,
+    config: BidsConfig,
+    write_lock: AbstractContextManager | None = None,
+) -> None:
+    """Write entities as a single BIDS model, merging it into the BIDS tree."""
+    builder = BidsBuilder()
+    for entity in entities:
+        builder.add(**entity)
+    model = builder.build()
+    with write_lock or nullcontext(), stage("bids_write", files=len(entities)):
+        BidsWriter(bids_root, config, model).write()
+
+
+async def _produce(
+    items: Iterable[T],
+    build: Callable[[T], list[dict[str, Any]]],
+    queue: asyncio.Queue,
+    build_workers: int,
+) -> int:
+    """Queue tasks building the entities of each item, returning their number.
+
+    Entities are built on at most build_workers threads at a time, so that
+    resolving rows and parsing responses does not block the writer.
+    """
+    semaphore = asyncio.Semaphore(build_workers)
+
+    async def build_entities(item: T) -> list[dict[str, Any]]:
+        async with semaphore:
+            return await asyncio.to_thread(build, item)
+
+    count = 0
+    for item in items:
+        await queue.put(asyncio.create_task(build_entities(item)))
+        count += 1
+    await queue.put(_DONE)
+    return count
+
+
+async def _consume(
+    queue: asyncio.Queue,
+    bids_root: Path,
+    config: BidsConfig,
+    write_lock: AbstractContextManager | None,
+) -> None:
+    """Write built models from queue in order on a worker thread until done."""
+    while (task := await queue.get()) is not _DONE:
+        entities = await task
+        await asyncio.to_thread(write_model, entities, bids_root, config, write_lock)
+
+
+async def write_models(
+    items: Iterable[T],
+    build: Callable[[T], list[dict[str, Any]]],
+    bids_root: Path,
+    config: BidsConfig,
+    build_workers: int = 1,
+    queue_size: int = 64,
+    write_lock: AbstractContextManager | None = None,
+) -> int:
+    """Write a model of the entities built for each item, returning their number.
+
+    Entities of items, e.g. the subjects of a report, are built by
+    build_workers concurrent workers while earlier models are written, so that
+    the full model is never held in memory. At most queue_size models wait to
+    be written. Models are written one at a time, in the order of items, so that
+    shared files, e.g. participants.tsv, are merged in a deterministic order.
+    Each model is written on its own, so it must hold all entities of its
+    subjects, and the BIDS config must merge into existing files. The writer
+    holds write_lock, if given, while writing.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    producer = asyncio.create_task(_produce(items, build, queue, build_workers))
+    consumer = asyncio.create_task(_consume(queue, bids_root, config, write_lock))
+    try:
+        count, _ = await asyncio.gather(producer, consumer)
+    except BaseException:
+        # Stop the other task, which could otherwise wait on the queue forever,
+        # and the queued builds, whose results are no longer written.
+        producer.cancel()
+        consumer.cancel()
+        while not queue.empty():
+            if (task := queue.get_nowait()) is not _DONE:
+                task.cancel()
+        raise
+    LOG.debug(f"Wrote {count} models built by {build_workers} workers.")
+    return count
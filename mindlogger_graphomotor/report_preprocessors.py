@@ -5,66 +5,160 @@ from __future__ import annotations
 import logging
 from typing import Protocol
 
+import numpy as np
 import pandas as pd
 
+from .instrumentation import stage
+from .timestamps import (
+    DEFAULT_TIMEZONE,
+    EPOCH_MS_TIMEZONE_ATTR,
+    TIMEZONE_OFFSET_COLUMN,
+    to_datetime,
+    to_offset_datetime,
+)
+
 LOG = logging.getLogger(__name__)
 
+# Optional boolean report column marking crash duplicates found across chunks,
+# dropped by crash handling in addition to duplicates within the report.
+CRASH_DUPLICATE_COLUMN = "crash_duplicate"
+
 
 class ReportPreprocessor(Protocol):
-    """Protocol for data preprocessing."""
+    """Protocol for data preprocessing.
+
+    Preprocessors modify columns of report and activity in place and select
+    report rows to keep through a boolean mask, so that a chain of
+    preprocessors copies the report only once, when the combined mask is
+    applied by run_preprocessors. Rows dropped by earlier preprocessors are
+    still present in the frames, and must be ignored using the mask where
+    they would change the result. Preprocessors that only implement __call__
+    are called with the frames filtered so far instead.
+    """
+
+    def apply(
+        self, report: pd.DataFrame, activity: pd.DataFrame, keep: np.ndarray
+    ) -> np.ndarray:
+        """Preprocess report and activity in place, returning the keep mask."""
+        return keep
 
     def __call__(
         self, report: pd.DataFrame, activity: pd.DataFrame
     ) -> tuple[pd.DataFrame, pd.DataFrame]:
         """Preprocess the report."""
-        pass
+        keep = self.apply(report, activity, np.ones(len(report), dtype=bool))
+        return _apply_mask(report, keep), activity
+
+
+def _apply_mask(report: pd.DataFrame, keep: np.ndarray) -> pd.DataFrame:
+    """Select kept report rows, without copying if all rows are kept."""
+    return report if keep.all() else report[keep]
+
+
+def _implements_apply(preprocessor: ReportPreprocessor) -> bool:
+    """Whether preprocessor implements apply, rather than only __call__."""
+    apply = getattr(type(preprocessor), "apply", ReportPreprocessor.apply)
+    return apply is not ReportPreprocessor.apply
+
+
+def run_preprocessors(
+    preprocessors: list[ReportPreprocessor],
+    report: pd.DataFrame,
+    activity: pd.DataFrame,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Run chain of preprocessors, applying their combined row mask once.
+
+    Preprocessors that do not implement apply are called with the frames
+    filtered so far.
+    """
+    keep = np.ones(len(report), dtype=bool)
+    for preprocessor in preprocessors:
+        with stage(f"preprocess.{preprocessor.__class__.__name__}", rows=len(report)):
+            if _implements_apply(preprocessor):
+                keep = preprocessor.apply(report, activity, keep)
+            else:
+                report, activity = preprocessor(_apply_mask(report, keep), activity)
+                keep = np.ones(len(report), dtype=bool)
+    with stage("preprocess.apply_mask", rows=len(report)):
+        return _apply_mask(report, keep), activity
+
+
+def report_study_id(report: pd.DataFrame) -> pd.Series:
+    """study_id of each report row, as assigned by StudyIdPreprocessor."""
+    # Construct column for study_id
+    study_id = report["response"].where(report["item"] == "study_id")
+    # Set study_id for cursive_q to the row above, backfill other values
+    return study_id.fillna(study_id.shift(1)).bfill()
+
+
+def activity_study_id(activity: pd.DataFrame) -> pd.Series:
+    """study_id of each activity row, as assigned by StudyIdPreprocessor."""
+    # Construct column for study_id in activity
+    study_id = activity["response"].where(activity["item"] == "study_id")
+    # Set fill stop value for cursive_q, backfill other values
+    study_id.loc[activity["item"] == "cursive_q"] = "STOP"
+    study_id = study_id.bfill()
+    # Remove fill stop value and forward fill
+    study_id.loc[study_id == "STOP"] = pd.NA
+    return study_id.ffill()
 
 
 class StudyIdPreprocessor(ReportPreprocessor):
     """Preprocessor for adding study_id to report."""
 
-    def __call__(
-        self, report: pd.DataFrame, activity: pd.DataFrame
-    ) -> tuple[pd.DataFrame, pd.DataFrame]:
-        """Preprocess the report."""
-        # Construct column for study_id
-        report["study_id"] = report["response"].where(report["item"] == "study_id")
-        # Set study_id for cursive_q to the row above, backfill other values
-        report["study_id"] = (
-            report["study_id"].fillna(report["study_id"].shift(1)).bfill()
-        )
+    def apply(
+        self, report: pd.DataFrame, activity: pd.DataFrame, keep: np.ndarray
+    ) -> np.ndarray:
+        """Add study_id to report and activity, and drop study_id report rows."""
+        report["study_id"] = report_study_id(report)
         # Drop study_id rows
-        report = report.drop(index=report[report["item"] == "study_id"].index)
+        keep &= ~(report["item"] == "study_id").to_numpy()
 
-        # Construct column for study_id in activity
-        activity["study_id"] = activity["response"].where(
-            activity["item"] == "study_id"
+        activity["study_id"] = activity_study_id(activity)
+        return keep
+
+
+def _convert_timestamps(report: pd.DataFrame, timezone: str | None, lazy: bool) -> None:
+    """Convert report timestamps in place, or mark them for lazy formatting."""
+    if timezone is None and TIMEZONE_OFFSET_COLUMN not in report:
+        raise ValueError(
+            f"Report has no {TIMEZONE_OFFSET_COLUMN} column for per-row timezones."
         )
-        # Set fill stop value for cursive_q, backfill other values
-        activity.loc[activity["item"] == "cursive_q", "study_id"] = "STOP"
-        activity["study_id"] = activity["study_id"].bfill()
-        # Remove fill stop value and forward fill
-        # activity.loc[activity["item"] == "cursive_q", "study_id"] = pd.NA
-        activity.loc[activity["study_id"] == "STOP", "study_id"] = pd.NA
-        activity["study_id"] = activity["study_id"].ffill()
-        return report, activity
+    if lazy:
+        report.attrs[EPOCH_MS_TIMEZONE_ATTR] = timezone
+        return
+    for column in ("activity_end_time", "activity_start_time"):
+        if timezone is None:
+            report[column] = to_offset_datetime(
+                report[column], report[TIMEZONE_OFFSET_COLUMN]
+            )
+        else:
+            report[column] = to_datetime(report[column], timezone)
 
 
 class DateTimePreprocessor(ReportPreprocessor):
-    """Convert timestamps to datetime."""
+    """Convert timestamps to datetime.
 
-    def __call__(
-        self, report: pd.DataFrame, activity: pd.DataFrame
-    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+    Timestamps are converted to timezone, or if it is None, to the UTC offset
+    of each row in the timezone_offset column. If lazy is set, timestamps are
+    kept as epoch milliseconds, and formatted as ISO 8601 strings only when
+    report metadata is constructed, which requires processing report frames
+    rather than single rows.
+    """
+
+    def __init__(
+        self, timezone: str | None = DEFAULT_TIMEZONE, lazy: bool = False
+    ) -> None:
+        """Initialize preprocessor."""
+        self.timezone = timezone
+        self.lazy = lazy
+
+    def apply(
+        self, report: pd.DataFrame, activity: pd.DataFrame, keep: np.ndarray
+    ) -> np.ndarray:
         """Convert timestamps in report and activity to datetime."""
-        # Convert timestamps to datetime
-        report["activity_end_time"] = pd.to_datetime(
-            report["activity_end_time"], unit="ms", utc=True
-        ).dt.tz_convert("America/New_York")
-        report["activity_start_time"] = pd.to_datetime(
-            report["activity_start_time"], unit="ms", utc=True
-        ).dt.tz_convert("America/New_York")
-        return report, activity
+        _convert_timestamps(report, self.timezone, self.lazy)
+        return keep
 
 
 class CrashPreprocessor(ReportPreprocessor):
@@ -73,11 +167,12 @@ class CrashPreprocessor(ReportPreprocessor):
     Note: Relies on report being ordered by timestamp.
     """
 
-    def __call__(
-        self, report: pd.DataFrame, activity: pd.DataFrame
-    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+    def apply(
+        self, report: pd.DataFrame, activity: pd.DataFrame, keep: np.ndarray
+    ) -> np.ndarray:
         """Handle crashes in report."""
-        if not report["activity_start_time"].is_monotonic_decreasing:
+        kept = np.flatnonzero(keep)
+        if not report["activity_start_time"].iloc[kept].is_monotonic_decreasing:
             raise ValueError(
                 "Report must be ordered by timestamp for CrashPreprocessor to work "
                 "correctly. Disable CrashPreprocessor or sort report."
@@ -87,5 +182,128 @@ class CrashPreprocessor(ReportPreprocessor):
         # For auto-skip responses, no duplicates should exist in report, do not modify.
         # Do not modify activity_user_journey, so that skip events are preserved
         # for analysis.
-        report = report.drop_duplicates(subset=["study_id", "item_id"], keep="last")
-        return report, activity
+        duplicated = report[["study_id", "item_id"]].iloc[kept].duplicated(keep="last")
+        keep[kept[duplicated.to_numpy()]] = False
+        _drop_crash_duplicates(report, keep)
+        return keep
+
+
+def _drop_crash_duplicates(report: pd.DataFrame, keep: np.ndarray) -> None:
+    """Clear keep for rows marked in CRASH_DUPLICATE_COLUMN, and remove it."""
+    if CRASH_DUPLICATE_COLUMN in report:
+        keep &= ~report[CRASH_DUPLICATE_COLUMN].to_numpy(dtype=bool)
+        report.drop(columns=CRASH_DUPLICATE_COLUMN, inplace=True)
+
+
+def _next_position(marked: np.ndarray) -> np.ndarray:
+    """Position of the next marked row at or after each row, or len if none."""
+    positions = np.where(marked, np.arange(len(marked)), len(marked))
+    return np.minimum.accumulate(positions[::-1])[::-1]
+
+
+def _last_position(marked: np.ndarray) -> np.ndarray:
+    """Position of the last marked row at or before each row, or -1 if none."""
+    return np.maximum.accumulate(np.where(marked, np.arange(len(marked)), -1))
+
+
+def _take(column: pd.Series, positions: np.ndarray) -> pd.Series:
+    """Take values of column at positions, with NA where positions are -1."""
+    return pd.Series(column.array.take(positions, allow_fill=True), index=column.index)
+
+
+class FusedPreprocessor(ReportPreprocessor):
+    """Single pass equivalent of the default preprocessor chain.
+
+    Gives the same output as StudyIdPreprocessor, DateTimePreprocessor and
+    CrashPreprocessor run in that order. Fills study_id by computing source
+    row positions with cumulative numpy operations and taking responses once,
+    and finds crash duplicates on integer codes instead of hashing string
+    columns. Meant for large exports. Timezone and lazy are as for
+    DateTimePreprocessor.
+    """
+
+    def __init__(
+        self, timezone: str | None = DEFAULT_TIMEZONE, lazy: bool = False
+    ) -> None:
+        """Initialize preprocessor."""
+        self.timezone = timezone
+        self.lazy = lazy
+
+    def apply(
+        self, report: pd.DataFrame, activity: pd.DataFrame, keep: np.ndarray
+    ) -> np.ndarray:
+        """Add study_id and datetimes, and drop study_id and crashed rows."""
+        n_rows = len(report)
+        response = report["response"]
+        is_study_id = (report["item"] == "study_id").to_numpy(dtype=bool)
+        # Rows with a study_id, or just after one, take their value from there,
+        # other rows backfill from the next such row.
+        has_value = is_study_id & response.notna().to_numpy()
+        after_value = np.concatenate([[False], has_value[:-1]])
+        source = np.where(has_value, np.arange(n_rows), np.arange(n_rows) - 1)
+        next_filled = _next_position(has_value | after_value)
+        positions = np.full(n_rows, -1)
+        found = next_filled < n_rows
+        positions[found] = source[next_filled[found]]
+        report["study_id"] = _take(response, positions)
+        keep &= ~is_study_id
+
+        _convert_timestamps(report, self.timezone, self.lazy)
+
+        kept = np.flatnonzero(keep)
+        if not report["activity_start_time"].iloc[kept].is_monotonic_decreasing:
+            raise ValueError(
+                "Report must be ordered by timestamp for FusedPreprocessor to work "
+                "correctly. Disable FusedPreprocessor or sort report."
+            )
+        # Only study_id rows are sources, so only their responses are coded.
+        response_codes = np.full(n_rows, -1)
+        response_codes[has_value] = pd.factorize(response[has_value])[0]
+        study_codes = np.where(positions >= 0, response_codes[positions], -1) + 1
+        item_codes = pd.factorize(report["item_id"])[0] + 1
+        key = study_codes.astype(np.int64) * (item_codes.max(initial=0) + 1)
+        key += item_codes
+        duplicated = pd.Series(key[kept]).duplicated(keep="last").to_numpy()
+        keep[kept[duplicated]] = False
+        _drop_crash_duplicates(report, keep)
+
+        self._activity_study_id(activity)
+        return keep
+
+    @staticmethod
+    def _activity_study_id(activity: pd.DataFrame) -> None:
+        """Add study_id to activity, as StudyIdPreprocessor does."""
+        response = activity["response"]
+        item = activity["item"]
+        # Stops are cursive_q rows, and study_id rows that StudyIdPreprocessor
+        # would confuse with its fill stop value.
+        is_study_id = (item == "study_id").to_numpy(dtype=bool)
+        is_stop = (item == "cursive_q").to_numpy(dtype=bool) | (
+            is_study_id & (response == "STOP").to_numpy(dtype=bool, na_value=False)
+        )
+        has_value = is_study_id & response.notna().to_numpy() & ~is_stop
+        # Backfill from the next study_id row unless a stop comes first, then
+        # forward fill the remaining rows.
+        next_marker = _next_position(has_value | is_stop)
+        backfilled = np.full(len(activity), -1)
+        found = next_marker < len(activity)
+        found[found] = has_value[next_marker[found]]
+        backfilled[found] = next_marker[found]
+        last_filled = _last_position(found)
+        positions = np.where(last_filled >= 0, backfilled[last_filled], -1)
+        activity["study_id"] = _take(response, positions)
+
+
+def default_preprocessors(
+    timezone: str | None = DEFAULT_TIMEZONE,
+    lazy_timestamps: bool = False,
+    fused: bool = False,
+) -> list[ReportPreprocessor]:
+    """Default preprocessor chain, or its fused equivalent if fused is set."""
+    if fused:
+        return [FusedPreprocessor(timezone, lazy_timestamps)]
+    return [
+        StudyIdPreprocessor(),
+        DateTimePreprocessor(timezone, lazy_timestamps),
+        CrashPreprocessor(),
+    ]
@@ -0,0 +1,89 @@
+"""Column schemas for reading MindLogger export files."""
+
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+LOG = logging.getLogger(__name__)
+
+try:
+    import pyarrow  # noqa: F401
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+STRING_DTYPE = "string[pyarrow]" if HAS_PYARROW else "string"
+# Millisecond epoch timestamps, nullable for unscheduled activities.
+TIMESTAMP_DTYPE = "Int64"
+
+# Columns shared by report.csv and activity_user_journey.csv of all versions.
+_COMMON_DTYPES = {
+    "id": STRING_DTYPE,
+    "activity_scheduled_time": TIMESTAMP_DTYPE,
+    "activity_start_time": TIMESTAMP_DTYPE,
+    "activity_end_time": TIMESTAMP_DTYPE,
+    "secret_user_id": STRING_DTYPE,
+    "userId": STRING_DTYPE,
+    "activity_id": STRING_DTYPE,
+    "activity_name": "category",
+    "activity_flow_id": STRING_DTYPE,
+    "activity_flow_name": "category",
+    "item_id": STRING_DTYPE,
+    "item": "category",
+    "response": STRING_DTYPE,
+    "prompt": STRING_DTYPE,
+    "options": STRING_DTYPE,
+    "version": "category",
+    "reviewing_id": STRING_DTYPE,
+    "event_id": STRING_DTYPE,
+}
+# Columns added in newer versions, read by NewDataProcessor.
+_NEW_VERSION_DTYPES = {
+    "activity_flow_submission_id": STRING_DTYPE,
+    "source_id": STRING_DTYPE,
+    "target_id": STRING_DTYPE,
+    "legacy_user_id": STRING_DTYPE,
+}
+REPORT_DTYPES = {**_COMMON_DTYPES, **_NEW_VERSION_DTYPES}
+ACTIVITY_USER_JOURNEY_DTYPES = {**_COMMON_DTYPES, **_NEW_VERSION_DTYPES}
+
+
+def _present_dtypes(path: Path, dtypes: dict[str, str]) -> dict[str, str]:
+    """Filter dtypes to the columns in the header of a CSV file.
+
+    Columns of other versions are skipped, and undeclared columns are inferred.
+    """
+    columns = pd.read_csv(path, nrows=0).columns
+    return {column: dtype for column, dtype in dtypes.items() if column in columns}
+
+
+def read_export_csv(path: Path, dtypes: dict[str, str]) -> pd.DataFrame:
+    """Read export CSV with declared dtypes, using the pyarrow engine if available."""
+    present = _present_dtypes(path, dtypes)
+    if HAS_PYARROW:
+        return pd.read_csv(path, dtype=present, engine="pyarrow")
+    LOG.debug("pyarrow not installed, reading CSV with C engine.")
+    return pd.read_csv(path, dtype=present)
+
+
+def read_empty_export_csv(path: Path, dtypes: dict[str, str]) -> pd.DataFrame:
+    """Read header of export CSV as an empty frame with declared dtypes."""
+    return pd.read_csv(path, dtype=_present_dtypes(path, dtypes), nrows=0)
+
+
+def read_export_csv_chunks(
+    path: Path, dtypes: dict[str, str], chunksize: int
+) -> Iterator[pd.DataFrame]:
+    """Read export CSV with declared dtypes in chunks of chunksize rows.
+
+    The pyarrow engine does not support chunked reading, so the C engine is used.
+    """
+    with pd.read_csv(
+        path, dtype=_present_dtypes(path, dtypes), chunksize=chunksize
+    ) as chunks:
+        yield from chunks
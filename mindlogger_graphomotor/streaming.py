@@ -0,0 +1,201 @@
+"""Chunked reading of report files, in blocks of whole subjects."""
+
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+from .report_preprocessors import (
+    CRASH_DUPLICATE_COLUMN,
+    activity_study_id,
+    report_study_id,
+)
+from .schemas import (
+    ACTIVITY_USER_JOURNEY_DTYPES,
+    REPORT_DTYPES,
+    read_export_csv_chunks,
+)
+
+LOG = logging.getLogger(__name__)
+
+
+def report_cut(report: pd.DataFrame) -> int:
+    """Number of leading report rows whose study_id does not depend on later rows.
+
+    StudyIdPreprocessor assigns each row the study_id of the next study_id row
+    with a response, except for the row just after a study_id row, which takes
+    the one before. The stream can therefore be cut two rows after a study_id
+    row with a response that is not followed by another study_id row.
+    """
+    is_study_id = (report["item"] == "study_id").to_numpy()
+    has_value = is_study_id & report["response"].notna().to_numpy()
+    candidates = np.flatnonzero(has_value[:-1] & ~is_study_id[1:])
+    return int(candidates[-1]) + 2 if len(candidates) else 0
+
+
+def activity_cut(activity: pd.DataFrame) -> int:
+    """Number of leading activity rows whose study_id does not depend on later rows.
+
+    StudyIdPreprocessor backfills activity rows from the next study_id or
+    cursive_q row with a response, and forward fills rows before a cursive_q
+    row, or a study_id row with a STOP response. The stream can therefore be
+    cut after any of those rows if the next of them is a study_id row with a
+    response other than STOP.
+    """
+    item = activity["item"].to_numpy()
+    response = activity["response"]
+    is_cursive_q = item == "cursive_q"
+    is_study_id = item == "study_id"
+    has_response = response.notna().to_numpy()
+    is_stop = (response == "STOP").to_numpy(dtype=bool, na_value=False)
+    markers = np.flatnonzero(is_cursive_q | is_study_id)
+    fills = (is_cursive_q | has_response)[markers]
+    fills_study_id = (is_study_id & has_response & ~is_stop)[markers]
+    candidates = np.flatnonzero(fills[:-1] & fills_study_id[1:])
+    if not len(candidates):
+        return 0
+    return int(markers[candidates[-1]]) + 1
+
+
+def iter_blocks(
+    chunks: Iterable[pd.DataFrame], cut: Callable[[pd.DataFrame], int]
+) -> Iterator[pd.DataFrame]:
+    """Regroup chunks into blocks ending where cut allows the stream to be split."""
+    pending: pd.DataFrame | None = None
+    for chunk in chunks:
+        pending = chunk if pending is None else pd.concat([pending, chunk])
+        position = cut(pending)
+        if position:
+            yield pending.iloc[:position]
+            pending = pending.iloc[position:]
+    if pending is not None and len(pending):
+        yield pending
+
+
+def block_groups(study_ids: Iterable[pd.Series]) -> list[int]:
+    """Last block of the group of each block, given the study_ids of blocks.
+
+    Subjects may come back in later blocks, e.g. with a crashed attempt or a
+    repeated session. Blocks sharing a study_id, directly or through other
+    blocks, form a group, so that each subject is written in a single model.
+    """
+    parent: list[int] = []
+    first_block: dict[str, int] = {}
+
+    def find(block: int) -> int:
+        while parent[block] != block:
+            parent[block] = parent[parent[block]]
+            block = parent[block]
+        return block
+
+    for block, block_study_ids in enumerate(study_ids):
+        parent.append(block)
+        for study_id in block_study_ids.dropna().unique():
+            other = find(first_block.setdefault(study_id, block))
+            parent[find(block)] = other
+    last: dict[int, int] = {}
+    roots = [find(block) for block in range(len(parent))]
+    for block, root in enumerate(roots):
+        last[root] = block
+    return [last[root] for root in roots]
+
+
+def iter_grouped_blocks(
+    blocks: Iterable[pd.DataFrame], last_blocks: list[int]
+) -> Iterator[pd.DataFrame]:
+    """Join blocks of each group, in file order, once its last block is read.
+
+    Blocks end where the stream can be cut, so blocks that were not adjacent
+    in the file can be joined, keeping the order of their rows.
+    """
+    pending: dict[int, list[pd.DataFrame]] = {}
+    for block_number, block in enumerate(blocks):
+        last = last_blocks[block_number]
+        pending.setdefault(last, []).append(block)
+        if last == block_number:
+            group = pending.pop(last)
+            yield group[0] if len(group) == 1 else pd.concat(group)
+
+
+def crash_duplicates(blocks: Iterable[pd.DataFrame]) -> np.ndarray:
+    """Positions of report rows superseded by a later row of their study item.
+
+    Crashed attempts appear as duplicate study_id, item_id rows, of which
+    CrashPreprocessor keeps the last. Duplicates may fall in different blocks,
+    so they are found over all blocks, with study_id as StudyIdPreprocessor
+    assigns it. Positions count rows from the start of the first block.
+    """
+    last: dict[tuple, int] = {}
+    superseded: list[int] = []
+    offset = 0
+    for block in blocks:
+        rows = (block["item"] != "study_id").to_numpy()
+        keys = pd.DataFrame(
+            {"study_id": report_study_id(block), "item_id": block["item_id"]}
+        )[rows].astype(object)
+        # Missing values compare equal in duplicated, but not as dict keys.
+        keys = keys.where(keys.notna(), None)
+        positions = offset + np.flatnonzero(rows)
+        for key, position in zip(keys.itertuples(index=False, name=None), positions):
+            previous = last.get(key)
+            if previous is not None:
+                superseded.append(previous)
+            last[key] = int(position)
+        offset += len(block)
+    return np.sort(np.array(superseded, dtype=np.int64))
+
+
+def iter_report_blocks(path: Path, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Read report.csv in blocks of whole subjects of about chunksize rows.
+
+    The file is read twice, first to find crash duplicates and the subjects
+    of blocks. Crash duplicates are marked in CRASH_DUPLICATE_COLUMN for
+    CrashPreprocessor, and blocks sharing subjects are joined.
+    """
+
+    def blocks() -> Iterator[pd.DataFrame]:
+        chunks = read_export_csv_chunks(path, REPORT_DTYPES, chunksize)
+        return iter_blocks(chunks, report_cut)
+
+    study_ids: list[pd.Series] = []
+
+    def recorded(blocks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        for block in blocks:
+            study_ids.append(pd.Series(report_study_id(block).unique()))
+            yield block
+
+    duplicates = crash_duplicates(recorded(blocks()))
+
+    def marked() -> Iterator[pd.DataFrame]:
+        offset = 0
+        for block in blocks():
+            positions = offset + np.arange(len(block))
+            block = block.copy()
+            block[CRASH_DUPLICATE_COLUMN] = np.isin(positions, duplicates)
+            offset += len(block)
+            yield block
+
+    for block in iter_grouped_blocks(marked(), block_groups(study_ids)):
+        LOG.debug(f"Read {len(block)} report rows from {path}")
+        yield block
+
+
+def iter_activity_blocks(path: Path, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Read activity_user_journey.csv in blocks of whole subjects.
+
+    The file is read twice, first to find the subjects of blocks, so that
+    blocks sharing subjects are joined.
+    """
+
+    def blocks() -> Iterator[pd.DataFrame]:
+        chunks = read_export_csv_chunks(path, ACTIVITY_USER_JOURNEY_DTYPES, chunksize)
+        return iter_blocks(chunks, activity_cut)
+
+    study_ids = [pd.Series(activity_study_id(block).unique()) for block in blocks()]
+    for block in iter_grouped_blocks(blocks(), block_groups(study_ids)):
+        LOG.debug(f"Read {len(block)} activity rows from {path}")
+        yield block
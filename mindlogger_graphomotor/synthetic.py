@@ -0,0 +1,154 @@
+"""Synthetic MindLogger exports for tests and benchmarks."""
+
+from __future__ import annotations
+
+import logging
+import random
+import string
+import uuid
+import zipfile
+from pathlib import Path
+
+import pandas as pd
+
+LOG = logging.getLogger(__name__)
+
+EXPORT_DATE = "Mon Jan 1 2024"
+_START_TIME_MS = 1_700_000_000_000
+_ACTIVITY_SECONDS = 60
+
+
+def _uuid(rng: random.Random) -> str:
+    """Random UUID from rng."""
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _item_name(index: int) -> str:
+    """Drawing item name without digits, so that the run digit parses."""
+    letters = string.ascii_lowercase
+    suffix = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, len(letters))
+        suffix = letters[remainder] + suffix
+    return f"drawing_{suffix}"
+
+
+def _drawing_csv(rng: random.Random, rows: int) -> str:
+    """Drawing response CSV of rows points."""
+    lines = ["x,y,time"]
+    lines.extend(
+        f"{rng.random():.6f},{rng.random():.6f},{row * 10}" for row in range(rows)
+    )
+    return "\n".join(lines) + "\n"
+
+
+def _trails_csv(rng: random.Random, rows: int) -> str:
+    """Trails response CSV of rows points."""
+    lines = ['x,y,"line,number",time']
+    lines.extend(
+        f"{rng.random():.6f},{rng.random():.6f},{row % 5},{row * 10}"
+        for row in range(rows)
+    )
+    return "\n".join(lines) + "\n"
+
+
+def write_synthetic_export(
+    directory: Path,
+    subjects: int = 10,
+    items: int = 3,
+    files_per_item: int = 1,
+    file_rows: int = 100,
+    media_bytes: int = 1024,
+    version: str = "1.2.3",
+    seed: int = 0,
+) -> Path:
+    """Write a synthetic export to directory, returning the directory.
+
+    Each subject has one study with a study_id and cursive_q row, files_per_item
+    drawing CSVs for each of items drawing items, files_per_item trails CSVs,
+    one media file of media_bytes bytes and one value response. Response files
+    are named to match the drawing and trails filename patterns of
+    GraphomotorReport, and zipped into drawing, media and trails response zips.
+    Report rows are ordered by descending start time, as in real exports.
+    """
+    if not 1 <= files_per_item <= 9:
+        raise ValueError("files_per_item must be between 1 and 9.")
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    report_rows: list[dict] = []
+    activity_rows: list[dict] = []
+    drawings: dict[str, str] = {}
+    media: dict[str, bytes] = {}
+    trails: dict[str, str] = {}
+    start_time = _START_TIME_MS
+    for subject in range(subjects):
+        study_id = f"S{subject:05d}"
+        report_id = _uuid(rng)
+        user_id = _uuid(rng)
+        # Responses of the study, latest first, with item, item_id and response.
+        responses: list[tuple[str, str, str]] = [("value_q", "value_q", "value: 3")]
+        name = f"{report_id}-{user_id}-audio_q1.m4a"
+        media[name] = rng.randbytes(media_bytes)
+        responses.append(("audio_q", "audio_q", name))
+        for run in range(1, files_per_item + 1):
+            name = f"{report_id}-trail{run}.csv"
+            trails[name] = _trails_csv(rng, file_rows)
+            responses.append(("trail", f"trail{run}", name))
+        for index in range(items):
+            item = _item_name(index)
+            for run in range(1, files_per_item + 1):
+                name = f"{report_id}-{user_id}-{item}{run}.csv"
+                drawings[name] = _drawing_csv(rng, file_rows)
+                responses.append((item, f"{item}{run}", name))
+        responses.append(("study_id", "study_id", study_id))
+        responses.append(("cursive_q", "cursive_q", "value: 1"))
+
+        start_time -= _ACTIVITY_SECONDS * 1000
+        for item, item_id, response in responses:
+            row = {
+                "id": _uuid(rng),
+                "activity_flow_submission_id": None,
+                "activity_scheduled_time": None,
+                "activity_start_time": start_time,
+                "activity_end_time": start_time + _ACTIVITY_SECONDS * 1000,
+                "flag": None,
+                "secret_user_id": study_id,
+                "userId": user_id,
+                "activity_id": "activity",
+                "activity_name": "Graphomotor",
+                "activity_flow_id": None,
+                "activity_flow_name": None,
+                "item_id": item_id,
+                "item": item,
+                "response": response,
+                "prompt": item,
+                "options": None,
+                "version": version,
+                "rawScore": None,
+                "reviewing_id": None,
+                "event_id": None,
+                "timezone_offset": -240,
+            }
+            report_rows.append(row)
+            activity_rows.append({**row, "id": _uuid(rng)})
+
+    pd.DataFrame(report_rows).to_csv(directory / "report.csv", index=False)
+    pd.DataFrame(activity_rows).to_csv(
+        directory / "activity_user_journey.csv", index=False
+    )
+    for prefix, members in (
+        ("drawing", drawings),
+        ("media", media),
+        ("trails", trails),
+    ):
+        path = directory / f"{prefix}-responses-{EXPORT_DATE}.zip"
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, content in members.items():
+                archive.writestr(name, content)
+    LOG.info(
+        f"Wrote synthetic export of {subjects} subjects, {len(report_rows)} "
+        f"report rows and {len(drawings) + len(media) + len(trails)} response "
+        f"files to {directory}"
+    )
+    return directory
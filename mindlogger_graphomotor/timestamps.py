@@ -0,0 +1,102 @@
+"""Vectorized timestamp conversion and formatting."""
+
+from __future__ import annotations
+
+import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_TIMEZONE = "America/New_York"
+# Report column holding the UTC offset of each row in minutes, east positive.
+TIMEZONE_OFFSET_COLUMN = "timezone_offset"
+# Frame attribute set when timestamp columns are kept as epoch milliseconds,
+# holding the timezone to format them in, or None for per-row offsets.
+EPOCH_MS_TIMEZONE_ATTR = "epoch_ms_timezone"
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name: str) -> datetime.tzinfo:
+    """Timezone of IANA name, cached."""
+    return ZoneInfo(name)
+
+
+@lru_cache(maxsize=None)
+def offset_timezone(minutes: int) -> datetime.timezone:
+    """Fixed timezone of UTC offset in minutes, cached."""
+    return datetime.timezone(datetime.timedelta(minutes=minutes))
+
+
+def to_datetime(epoch_ms: pd.Series, timezone: str) -> pd.Series:
+    """Convert epoch milliseconds to datetimes in timezone."""
+    return pd.to_datetime(epoch_ms, unit="ms", utc=True).dt.tz_convert(
+        get_timezone(timezone)
+    )
+
+
+def to_offset_datetime(epoch_ms: pd.Series, offsets: pd.Series) -> pd.Series:
+    """Convert epoch milliseconds to Timestamps with per-row UTC offsets.
+
+    Offsets are in minutes, east positive. Rows without an offset are in UTC.
+    The result is of object dtype, converted once per distinct offset.
+    """
+    utc = pd.to_datetime(epoch_ms, unit="ms", utc=True)
+    minutes = offsets.fillna(0).astype("int64")
+    converted = pd.Series(np.empty(len(utc), dtype=object), index=utc.index)
+    for offset in minutes.unique():
+        rows = (minutes == offset).to_numpy()
+        converted[rows] = utc[rows].dt.tz_convert(offset_timezone(int(offset)))
+    return converted
+
+
+def format_offsets(offsets: pd.Series) -> pd.Series:
+    """Format UTC offsets in minutes as +HH:MM, in UTC if missing."""
+    minutes = offsets.fillna(0).astype("int64")
+    sign = pd.Series(np.where(minutes < 0, "-", "+"), index=minutes.index)
+    hours, remainder = divmod(minutes.abs(), 60)
+    return (
+        sign + hours.astype(str).str.zfill(2) + ":" + remainder.astype(str).str.zfill(2)
+    )
+
+
+def format_epoch_ms(
+    epoch_ms: pd.Series, timezone: str | None, offsets: pd.Series | None = None
+) -> pd.Series:
+    """Format epoch milliseconds as ISO 8601 strings in a single vectorized pass.
+
+    Timestamps are formatted in timezone, or if it is None, at the per-row
+    offsets in minutes. Matches ``isoformat`` of the converted datetimes.
+    """
+    if timezone is not None:
+        return isoformat(to_datetime(epoch_ms, timezone))
+    if offsets is None:
+        raise ValueError("Offsets are required to format timestamps without timezone.")
+    minutes = offsets.fillna(0).astype("int64")
+    local = pd.to_datetime(epoch_ms + minutes * 60_000, unit="ms")
+    formatted = isoformat(local) + format_offsets(offsets)
+    return formatted.where(local.notna(), "NaT")
+
+
+def isoformat(timestamps: pd.Series) -> pd.Series:
+    """Format timestamps as ISO 8601 strings, matching ``Timestamp.isoformat``.
+
+    Datetime columns are formatted in a single vectorized pass. Other columns,
+    e.g. of Timestamps with mixed UTC offsets, are formatted per value.
+    """
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        return timestamps.map(lambda value: value.isoformat(), na_action="ignore")
+
+    formatted = timestamps.dt.strftime("%Y-%m-%dT%H:%M:%S")
+    microsecond = timestamps.dt.microsecond.fillna(0).astype("int64")
+    nanosecond = timestamps.dt.nanosecond.fillna(0).astype("int64")
+    fraction = "." + microsecond.astype(str).str.zfill(6)
+    fraction = fraction.where(
+        nanosecond == 0, fraction + nanosecond.astype(str).str.zfill(3)
+    )
+    formatted += fraction.where((microsecond != 0) | (nanosecond != 0), "")
+    if timestamps.dt.tz is not None:
+        offset = timestamps.dt.strftime("%z")
+        formatted += offset.str[:3] + ":" + offset.str[3:]
+    return formatted.where(timestamps.notna(), "NaT")
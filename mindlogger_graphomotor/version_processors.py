@@ -3,19 +3,157 @@
 from __future__ import annotations
 
 import logging
+from functools import lru_cache
 from pathlib import Path
-from typing import Protocol
+from typing import Iterable, Protocol, TypeAlias
 
 import pandas as pd
 from bidsi import BidsBuilder
-from packaging.version import Version
+from packaging.version import InvalidVersion, Version
+
+from .timestamps import (
+    EPOCH_MS_TIMEZONE_ATTR,
+    TIMEZONE_OFFSET_COLUMN,
+    format_epoch_ms,
+    isoformat,
+)
 
 LOG = logging.getLogger(__name__)
 
 
+# Report columns exported as entity metadata, keyed by metadata field.
+DEFAULT_METADATA_COLUMNS = {
+    "mindlogger_id": "id",
+    "activity_start_time": "activity_start_time",
+    "activity_end_time": "activity_end_time",
+    "activity_scheduled_time": "activity_scheduled_time",
+    "flag": "flag",
+    "secret_user_id": "secret_user_id",
+    "user_id": "userId",
+    "activity_id": "activity_id",
+    "activity_name": "activity_name",
+    "activity_flow_id": "activity_flow_id",
+    "activity_flow_name": "activity_flow_name",
+    "item_id": "item_id",
+    "item": "item",
+    "response": "response",
+    "prompt": "prompt",
+    "options": "options",
+    "version": "version",
+    "rawScore": "rawScore",
+    "reviewing_id": "reviewing_id",
+    "event_id": "event_id",
+    "timezone_offset": "timezone_offset",
+}
+NEW_METADATA_COLUMNS = {
+    "mindlogger_id": "id",
+    "activity_flow_submission_id": "activity_flow_submission_id",
+    "source_id": "source_id",
+    "target_id": "target_id",
+    "legacy_user_id": "legacy_user_id",
+    **{
+        field: column
+        for field, column in DEFAULT_METADATA_COLUMNS.items()
+        if field != "mindlogger_id"
+    },
+}
+TIMESTAMP_METADATA_FIELDS = ("activity_start_time", "activity_end_time")
+
+
+class LazyResource(Protocol):
+    """Report response parsed only when loaded.
+
+    GraphomotorReport.iter_bids_entities passes these as resources to
+    processors that do not read CSV resources, and loads them when their
+    entities are yielded, so that processors should add them to the builder
+    unchanged. Calling load gives the DataFrame or Path of the response.
+    """
+
+    def load(self) -> pd.DataFrame | Path:
+        """Parse response."""
+        pass
+
+
+# Resource of a report row passed to DataVersionProcessor.process_report_frame.
+ReportResource: TypeAlias = pd.DataFrame | Path | LazyResource
+
+
+def row_metadata(row: pd.Series, columns: dict[str, str]) -> dict:
+    """Construct metadata for a single report row, as frame_metadata does.
+
+    Each timestamp field is read from its own column, and missing values are
+    written as null rather than NaN, which is not valid JSON.
+    """
+    metadata = {
+        field: None if pd.isna(value := getattr(row, column)) else value
+        for field, column in columns.items()
+    }
+    for field in TIMESTAMP_METADATA_FIELDS:
+        if (timestamp := metadata.get(field)) is not None:
+            metadata[field] = timestamp.isoformat()
+    return metadata
+
+
+def frame_metadata(frame: pd.DataFrame, columns: dict[str, str]) -> list[dict]:
+    """Construct metadata for all rows of a report frame in one vectorized pass.
+
+    Timestamps kept as epoch milliseconds by a lazy DateTimePreprocessor are
+    formatted here.
+    """
+    metadata = pd.DataFrame(
+        {field: frame[column] for field, column in columns.items()}, index=frame.index
+    )
+    lazy = EPOCH_MS_TIMEZONE_ATTR in frame.attrs
+    for field in TIMESTAMP_METADATA_FIELDS:
+        if field not in metadata:
+            continue
+        if lazy:
+            timezone = frame.attrs[EPOCH_MS_TIMEZONE_ATTR]
+            metadata[field] = format_epoch_ms(
+                metadata[field],
+                timezone,
+                frame[TIMEZONE_OFFSET_COLUMN] if timezone is None else None,
+            )
+        else:
+            metadata[field] = isoformat(metadata[field])
+    # Missing values of nullable dtypes are pd.NA, which is not serializable.
+    metadata = metadata.astype(object).where(metadata.notna(), None)
+    return metadata.to_dict("records")
+
+
+def add_report_frame(
+    frame: pd.DataFrame,
+    resources: list[ReportResource],
+    builder: BidsBuilder,
+    columns: dict[str, str],
+) -> BidsBuilder:
+    """Add report rows with their resources to builder, skipping study_id rows."""
+    keep = (frame["item"] != "study_id").to_numpy()
+    frame = frame[keep]
+    records = frame_metadata(frame, columns)
+    kept_resources = [resource for resource, k in zip(resources, keep) if k]
+    for subject_id, task_name, resource, metadata in zip(
+        frame["study_id"], frame["item"], kept_resources, records
+    ):
+        builder.add(
+            subject_id=subject_id,
+            datatype="beh",
+            task_name=task_name,
+            resource=resource,
+            metadata=metadata,
+        )
+    return builder
+
+
 class DataVersionProcessor(Protocol):
     """Protocol for data version processing."""
 
+    METADATA_COLUMNS: dict[str, str] = DEFAULT_METADATA_COLUMNS
+    # Whether CSV resources must be DataFrames, e.g. to inspect their contents,
+    # rather than paths of TSV files transcoded when written. Resources passed
+    # to processors setting it are never LazyResources.
+    READS_CSV_RESOURCES: bool = False
+
     def check_version(self, version: Version) -> bool:
         """Check if the processor can handle the given version."""
         pass
@@ -38,42 +176,29 @@ class DataVersionProcessor(Protocol):
             datatype="beh",
             task_name=row.item,
             resource=resource,
-            metadata={
-                "mindlogger_id": row.id,
-                "source_id": row.source_id,
-                "target_id": row.target_id,
-                "legacy_user_id": row.legacy_user_id,
-                "activity_flow_submission_id": row.activity_flow_submission_id,
-                "activity_start_time": row.activity_start_time.isoformat(),
-                "activity_end_time": row.activity_start_time.isoformat(),
-                "activity_scheduled_time": row.activity_scheduled_time,
-                "flag": row.flag,
-                "secret_user_id": row.secret_user_id,
-                "user_id": row.userId,
-                "activity_id": row.activity_id,
-                "activity_name": row.activity_name,
-                "activity_flow_id": row.activity_flow_id,
-                "activity_flow_name": row.activity_flow_name,
-                "item_id": row.item_id,
-                "item": row.item,
-                "response": row.response,
-                "prompt": row.prompt,
-                "options": row.options,
-                "version": row.version,
-                "rawScore": row.rawScore,
-                "reviewing_id": row.reviewing_id,
-                "event_id": row.event_id,
-                "timezone_offset": row.timezone_offset,
-            },
+            metadata=row_metadata(row, self.METADATA_COLUMNS),
         )
         return builder
 
+    def process_report_frame(
+        self,
+        frame: pd.DataFrame,
+        resources: list[ReportResource],
+        builder: BidsBuilder,
+    ) -> BidsBuilder:
+        """Process rows of data with their resources, in report order.
+
+        Resources may be LazyResources, unless READS_CSV_RESOURCES is set.
+        """
+        return add_report_frame(frame, resources, builder, self.METADATA_COLUMNS)
+
 
 # TODO: Change name, confirm check_version correctly isolates data.
 class NewDataProcessor(DataVersionProcessor):
     """Processor for new MindLogger data."""
 
     MIN_VERSION = Version("14.6.149")
+    METADATA_COLUMNS = NEW_METADATA_COLUMNS
 
     def check_version(self, version: Version) -> bool:
         """Check if the processor can handle the given version."""
@@ -91,52 +216,12 @@ class NewDataProcessor(DataVersionProcessor):
         )
         return builder
 
-    def process_report_row(
-        self, row: pd.Series, resource: pd.DataFrame | Path, builder: BidsBuilder
-    ) -> BidsBuilder:
-        """Process a row of data, adding resources to builder."""
-        # Skip study_id rows
-        if row.item == "study_id":
-            return builder
-        builder.add(
-            subject_id=row.study_id,
-            datatype="beh",
-            task_name=row.item,
-            resource=resource,
-            metadata={
-                "mindlogger_id": row.id,
-                "activity_flow_submission_id": row.activity_flow_submission_id,
-                "source_id": row.source_id,
-                "target_id": row.target_id,
-                "legacy_user_id": row.legacy_user_id,
-                "activity_start_time": row.activity_start_time.isoformat(),
-                "activity_end_time": row.activity_start_time.isoformat(),
-                "activity_scheduled_time": row.activity_scheduled_time,
-                "flag": row.flag,
-                "secret_user_id": row.secret_user_id,
-                "user_id": row.userId,
-                "activity_id": row.activity_id,
-                "activity_name": row.activity_name,
-                "activity_flow_id": row.activity_flow_id,
-                "activity_flow_name": row.activity_flow_name,
-                "item_id": row.item_id,
-                "item": row.item,
-                "response": row.response,
-                "prompt": row.prompt,
-                "options": row.options,
-                "version": row.version,
-                "rawScore": row.rawScore,
-                "reviewing_id": row.reviewing_id,
-                "event_id": row.event_id,
-                "timezone_offset": row.timezone_offset,
-            },
-        )
-        return builder
-
 
 class DefaultDataProcessor(DataVersionProcessor):
     """Default processor for MindLogger data."""
 
+    METADATA_COLUMNS = DEFAULT_METADATA_COLUMNS
+
     def check_version(self, version: Version) -> bool:
         """Always return True for default processor."""
         return True
@@ -153,40 +238,23 @@ class DefaultDataProcessor(DataVersionProcessor):
         )
         return builder
 
-    def process_report_row(
-        self, row: pd.Series, resource: pd.DataFrame | Path, builder: BidsBuilder
-    ) -> BidsBuilder:
-        """Process a row of data, adding resources to builder."""
-        # Skip study_id rows
-        if row.item == "study_id":
-            return builder
-        builder.add(
-            subject_id=row.study_id,
-            datatype="beh",
-            task_name=row.item,
-            resource=resource,
-            metadata={
-                "mindlogger_id": row.id,
-                "activity_start_time": row.activity_start_time.isoformat(),
-                "activity_end_time": row.activity_start_time.isoformat(),
-                "activity_scheduled_time": row.activity_scheduled_time,
-                "flag": row.flag,
-                "secret_user_id": row.secret_user_id,
-                "user_id": row.userId,
-                "activity_id": row.activity_id,
-                "activity_name": row.activity_name,
-                "activity_flow_id": row.activity_flow_id,
-                "activity_flow_name": row.activity_flow_name,
-                "item_id": row.item_id,
-                "item": row.item,
-                "response": row.response,
-                "prompt": row.prompt,
-                "options": row.options,
-                "version": row.version,
-                "rawScore": row.rawScore,
-                "reviewing_id": row.reviewing_id,
-                "event_id": row.event_id,
-                "timezone_offset": row.timezone_offset,
-            },
-        )
-        return builder
+
+@lru_cache(maxsize=None)
+def parse_version(value: object) -> Version:
+    """Parse MindLogger version, treating unparseable versions as version 0."""
+    try:
+        return Version(str(value))
+    except InvalidVersion:
+        LOG.warning(f"Unparseable version {value!r}, treating as version 0.")
+        return Version("0")
+
+
+def select_processor(
+    processors: list[DataVersionProcessor], versions: Iterable[Version]
+) -> DataVersionProcessor | None:
+    """Select first processor that can handle all of the given versions."""
+    versions = list(versions)
+    for processor in processors:
+        if all(processor.check_version(version) for version in versions):
+            return processor
+    return None
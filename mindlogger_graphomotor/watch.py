@@ -0,0 +1,214 @@
+"""Watch folder for incoming MindLogger exports."""
+
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import Any
+
+from bidsi import BidsConfig
+
+from .batch import check_partial_writes, convert_export
+from .graphomotor import GraphomotorReport
+from .instrumentation import Instrumentation
+from .ledger import conversion_settings
+
+LOG = logging.getLogger(__name__)
+
+try:
+    from watchdog.events import FileSystemEvent, FileSystemEventHandler
+    from watchdog.observers import Observer
+    from watchdog.observers.api import BaseObserver
+
+    HAS_WATCHDOG = True
+except ImportError:
+    HAS_WATCHDOG = False
+
+if HAS_WATCHDOG:
+
+    class _InboxEventHandler(FileSystemEventHandler):
+        """Watchdog event handler marking the export touched by each event."""
+
+        def __init__(self, watcher: ExportWatcher) -> None:
+            """Initialize handler for watcher."""
+            super().__init__()
+            self._watcher = watcher
+
+        def dispatch(self, event: FileSystemEvent) -> None:
+            """Mark export containing the event path as changed."""
+            for path in (event.src_path, getattr(event, "dest_path", "")):
+                if path:
+                    self._watcher.touch(Path(os.fsdecode(path)))
+
+
+class ExportWatcher:
+    """Long-running converter of exports uploaded to an inbox directory.
+
+    Each directory directly below the inbox is a candidate export. A candidate
+    is queued for conversion once it holds a complete export set and its input
+    files have not changed for settle_seconds, so that partial uploads are not
+    converted. Changes are picked up with inotify through the optional
+    ``watchdog`` package, or by polling every poll_interval seconds if it is
+    not installed. Conversions run one at a time in this process, reusing the
+    loaded BIDS config.
+
+    Converted exports are only remembered in memory, so after a restart every
+    export in the inbox is converted again, unless incremental is set for the
+    ledger in the BIDS root to skip unchanged subjects and tasks.
+    """
+
+    def __init__(
+        self,
+        inbox: Path,
+        bids_root: Path,
+        config: Path,
+        settle_seconds: float = 30.0,
+        poll_interval: float = 5.0,
+        create_options: dict[str, Any] | None = None,
+        model_options: dict[str, Any] | None = None,
+        metrics_path: Path | None = None,
+        write_options: dict[str, Any] | None = None,
+        incremental: bool = False,
+    ) -> None:
+        """Initialize watcher.
+
+        If metrics_path is set, stage metrics accumulated over all conversions
+        are written to it after each conversion. If incremental is set, only
+        subjects and tasks changed since their last conversion are converted.
+        Raises ValueError if config overwrites subjects written in parts.
+        """
+        if incremental or (create_options or {}).get("chunksize"):
+            check_partial_writes(config)
+        if not incremental:
+            LOG.warning(
+                "Watching without incremental conversion, exports in the inbox "
+                "will be converted again after a restart."
+            )
+        self.inbox = inbox
+        self.bids_root = bids_root
+        self.config = BidsConfig.from_file(config)
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.create_options = create_options
+        self.model_options = model_options
+        self.metrics_path = metrics_path
+        self.write_options = write_options
+        self.incremental = incremental
+        # Digested along with loading config, so that both match.
+        self._ledger_settings = conversion_settings(config) if incremental else None
+        self._instrumentation = Instrumentation()
+        self._touched: set[Path] = set()
+        self._touched_lock = threading.Lock()
+        # Input file signatures of candidate exports, and when they last changed.
+        self._pending: dict[Path, tuple[tuple, float]] = {}
+        # Input file signatures of queued or converted exports.
+        self._seen: dict[Path, tuple] = {}
+        self._queue: queue.Queue[Path | None] = queue.Queue()
+
+    def touch(self, path: Path) -> None:
+        """Mark export containing path as changed."""
+        try:
+            relative = path.relative_to(self.inbox)
+        except ValueError:
+            return
+        if relative.parts:
+            with self._touched_lock:
+                self._touched.add(self.inbox / relative.parts[0])
+
+    def _scan(self) -> None:
+        """Mark all exports in inbox as changed."""
+        for path in self.inbox.iterdir():
+            if path.is_dir():
+                self.touch(path)
+
+    @staticmethod
+    def _signature(export_dir: Path) -> tuple | None:
+        """Signature of complete export input files, or None if incomplete."""
+        files = GraphomotorReport.export_files(export_dir)
+        if len(files) < 5:
+            return None
+        try:
+            signature = tuple(
+                (path.name, path.stat().st_size, path.stat().st_mtime_ns)
+                for path in files
+            )
+        except FileNotFoundError:
+            return None
+        # Zips without a central directory are still being uploaded.
+        if not all(zipfile.is_zipfile(path) for path in files[2:]):
+            return None
+        return signature
+
+    def _enqueue_settled(self) -> None:
+        """Queue changed exports whose input files have settled."""
+        with self._touched_lock:
+            candidates = self._touched | set(self._pending)
+            self._touched = set()
+        now = time.monotonic()
+        for export_dir in candidates:
+            signature = self._signature(export_dir)
+            if signature is None or self._seen.get(export_dir) == signature:
+                self._pending.pop(export_dir, None)
+                continue
+            pending = self._pending.get(export_dir)
+            if pending is None or pending[0] != signature:
+                self._pending[export_dir] = (signature, now)
+            elif now - pending[1] >= self.settle_seconds:
+                LOG.info(f"Queueing export {export_dir}")
+                del self._pending[export_dir]
+                self._seen[export_dir] = signature
+                self._queue.put(export_dir)
+
+    def _convert_queued(self) -> None:
+        """Convert queued exports until None is queued."""
+        while (export_dir := self._queue.get()) is not None:
+            result = convert_export(
+                export_dir,
+                self.bids_root,
+                self.config,
+                create_options=self.create_options,
+                model_options=self.model_options,
+                collect_metrics=self.metrics_path is not None,
+                write_options=self.write_options,
+                incremental=self.incremental,
+                ledger_settings=self._ledger_settings,
+            )
+            if result.metrics is not None and self.metrics_path is not None:
+                self._instrumentation.merge(result.metrics)
+                self._instrumentation.write(self.metrics_path)
+            if result.ok:
+                LOG.info(f"Converted {export_dir} in {result.seconds:.1f}s")
+            else:
+                LOG.error(f"Failed to convert {export_dir}: {result.error}")
+
+    def run(self, stop: threading.Event | None = None) -> None:
+        """Watch inbox and convert exports until stop is set."""
+        stop = stop or threading.Event()
+        converter = threading.Thread(target=self._convert_queued, daemon=True)
+        converter.start()
+        observer: BaseObserver | None = None
+        if HAS_WATCHDOG:
+            observer = Observer()
+            observer.schedule(_InboxEventHandler(self), str(self.inbox), recursive=True)
+            observer.start()
+            LOG.info(f"Watching {self.inbox} for exports.")
+        else:
+            LOG.info(f"watchdog not installed, polling {self.inbox} for exports.")
+        self._scan()
+        try:
+            while not stop.is_set():
+                if observer is None:
+                    self._scan()
+                self._enqueue_settled()
+                stop.wait(self.poll_interval if observer is None else 1.0)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            self._queue.put(None)
+            converter.join()
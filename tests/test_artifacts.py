@@ -0,0 +1,94 @@
+"""Response artifacts read on demand from zip archives."""
+
+import shutil
+from pathlib import Path
+
+import pytest
+from mindlogger_graphomotor.artifacts import ZipArtifactStore, read_csv_artifacts
+from mindlogger_graphomotor.passthrough import passthrough_copies
+from mindlogger_graphomotor.synthetic import EXPORT_DATE, write_synthetic_export
+from mindlogger_graphomotor.transcode import TsvArtifact
+
+
+def _store(tmp_path: Path) -> ZipArtifactStore:
+    """Store of the drawing responses of a synthetic export."""
+    archive = write_synthetic_export(tmp_path / "export", subjects=2) / (
+        f"drawing-responses-{EXPORT_DATE}.zip"
+    )
+    return ZipArtifactStore(archive, tmp_path / "extracted")
+
+
+@pytest.mark.parametrize(("workers", "use_processes"), [(4, False), (3, True)])
+def test_parallel_reads_keep_artifact_order(
+    tmp_path: Path, workers: int, use_processes: bool
+) -> None:
+    """Frames read by a pool of workers are those of a serial read, in order."""
+    store = _store(tmp_path)
+    artifacts = [
+        artifact for artifact in store.artifacts() if artifact.name.endswith(".csv")
+    ]
+    serial = [frame for frame, _ in read_csv_artifacts(artifacts)]
+    parallel = [
+        frame
+        for frame, _ in read_csv_artifacts(
+            artifacts, max_workers=workers, use_processes=use_processes
+        )
+    ]
+    assert len({frame.to_csv() for frame in serial}) == len(artifacts) > workers
+    assert [frame.to_csv() for frame in parallel] == [
+        frame.to_csv() for frame in serial
+    ]
+    assert not store.extract_dir.exists()
+    store.close()
+
+
+def _stale(content: bytes) -> bytes:
+    """Other content of the same size."""
+    return content[::-1]
+
+
+def test_members_are_extracted_on_request(tmp_path: Path) -> None:
+    """Members are read without extracting, and only requested ones extracted."""
+    store = _store(tmp_path)
+    first, second, *_ = store.artifacts()
+    with first.open() as member:
+        content = member.read()
+    assert not store.extract_dir.exists()
+
+    assert first.path().read_bytes() == content
+    assert first.path() == first.deferred_path()
+    assert not second.deferred_path().exists()
+    store.close()
+
+
+def test_stale_extracted_files_are_replaced(tmp_path: Path) -> None:
+    """Files of the same size left by another archive are not served."""
+    store = _store(tmp_path)
+    artifact = store.artifacts()[0]
+    with artifact.open() as member:
+        content = member.read()
+    path = artifact.deferred_path()
+    path.parent.mkdir(parents=True)
+    path.write_bytes(_stale(content))
+
+    assert artifact.path().read_bytes() == content
+    path.write_bytes(_stale(content))
+    with passthrough_copies(None, {path: artifact}) as methods:
+        shutil.copy(path, tmp_path / "streamed.csv")
+    assert methods == {"stream": 1}
+    assert (tmp_path / "streamed.csv").read_bytes() == content
+    store.close()
+
+
+def test_stale_transcoded_files_are_replaced(tmp_path: Path) -> None:
+    """TSV files left next to the CSV response are transcoded again."""
+    store = _store(tmp_path)
+    artifact = TsvArtifact(store.artifacts()[0])
+    with artifact.open() as transcoded:
+        content = transcoded.read()
+    path = artifact.deferred_path()
+    path.parent.mkdir(parents=True)
+    path.write_bytes(_stale(content))
+
+    assert artifact.path().read_bytes() == content
+    store.close()
@@ -0,0 +1,61 @@
+"""Batch conversion isolates failures of single exports."""
+
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from mindlogger_graphomotor import __main__, batch
+from mindlogger_graphomotor.batch import ExportResult, run_batch
+
+
+def _convert(export_dir: Path, *args: object, **kwargs: object) -> ExportResult:
+    """Convert export named ok, fail one named failed, and kill worker otherwise."""
+    if export_dir.name == "failed":
+        return ExportResult(export_dir, 0.1, error="ValueError('broken export')")
+    if export_dir.name != "ok":
+        # Let the other exports finish before the pool breaks.
+        time.sleep(0.5)
+        os._exit(1)
+    return ExportResult(export_dir, 0.1, rows=10)
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="Needs forked workers.")
+def test_run_batch_records_dead_workers(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    """A killed worker fails its export, and the batch still summarizes all."""
+    monkeypatch.setattr(batch, "convert_export", _convert)
+    export_dirs = [tmp_path / name for name in ("ok", "failed", "killed")]
+    with caplog.at_level(logging.INFO, logger=batch.__name__):
+        results = run_batch(export_dirs, tmp_path / "bids", tmp_path, workers=3)
+
+    assert [result.export_dir for result in results] == export_dirs
+    assert [result.ok for result in results] == [True, False, False]
+    assert "BrokenProcessPool" in str(results[2].error)
+    assert "Converted 1/3 exports, 10 report rows" in caplog.text
+    assert f"Failed: {export_dirs[2]}" in caplog.text
+
+
+@pytest.mark.parametrize(("names", "code"), [(["ok"], None), (["ok", "failed"], 1)])
+def test_cli_exits_with_failure_of_any_export(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    names: list[str],
+    code: int | None,
+) -> None:
+    """The command exits with status 1 if any export failed."""
+    monkeypatch.setattr(batch, "convert_export", _convert)
+    exports = [str(tmp_path / name) for name in names]
+    config = str(tmp_path / "config.toml")
+    monkeypatch.setattr(
+        sys, "argv", ["graphomotor", "-b", str(tmp_path), "-c", config, "-e", *exports]
+    )
+    if code is None:
+        __main__.cli()
+        return
+    with pytest.raises(SystemExit) as exit_info:
+        __main__.cli()
+    assert exit_info.value.code == code
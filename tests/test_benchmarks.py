@@ -0,0 +1,114 @@
+"""Throughput benchmarks on synthetic exports.
+
+Benchmarks are deselected by default. Run them with
+``pytest tests/test_benchmarks.py -m benchmark --benchmark-only``. The export
+size is scaled by the GRAPHOMOTOR_BENCHMARK_SUBJECTS environment variable.
+"""
+
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from mindlogger_graphomotor.__main__ import main
+from mindlogger_graphomotor.graphomotor import GraphomotorReport
+from mindlogger_graphomotor.report_preprocessors import (
+    CrashPreprocessor,
+    DateTimePreprocessor,
+    FusedPreprocessor,
+    ReportPreprocessor,
+    StudyIdPreprocessor,
+    run_preprocessors,
+)
+from mindlogger_graphomotor.schemas import (
+    ACTIVITY_USER_JOURNEY_DTYPES,
+    REPORT_DTYPES,
+    read_export_csv,
+)
+from mindlogger_graphomotor.synthetic import write_synthetic_export
+
+pytest.importorskip("pytest_benchmark")
+
+pytestmark = pytest.mark.benchmark
+
+SUBJECTS = int(os.environ.get("GRAPHOMOTOR_BENCHMARK_SUBJECTS", "20"))
+CONFIG = Path(__file__).parents[1] / "config" / "graphomotor.toml"
+
+
+@pytest.fixture(scope="module")
+def export_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """Synthetic export shared by the benchmarks of this module."""
+    return write_synthetic_export(
+        tmp_path_factory.mktemp("export"),
+        subjects=SUBJECTS,
+        items=3,
+        files_per_item=2,
+        file_rows=200,
+        media_bytes=64 * 1024,
+    )
+
+
+@pytest.fixture(scope="module")
+def frames(export_dir: Path) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Raw report and activity frames of the synthetic export."""
+    return (
+        read_export_csv(export_dir / "report.csv", REPORT_DTYPES),
+        read_export_csv(
+            export_dir / "activity_user_journey.csv", ACTIVITY_USER_JOURNEY_DTYPES
+        ),
+    )
+
+
+def test_create(benchmark, export_dir: Path) -> None:  # noqa: ANN001
+    """Benchmark reading an export."""
+    report = benchmark(GraphomotorReport.create, export_dir)
+    assert len(report)
+
+
+# Each preprocessor with the preprocessors that must run before it.
+PREPROCESSOR_CHAINS: dict[str, tuple[list[ReportPreprocessor], ReportPreprocessor]] = {
+    "StudyIdPreprocessor": ([], StudyIdPreprocessor()),
+    "DateTimePreprocessor": ([StudyIdPreprocessor()], DateTimePreprocessor()),
+    "CrashPreprocessor": (
+        [StudyIdPreprocessor(), DateTimePreprocessor()],
+        CrashPreprocessor(),
+    ),
+    "FusedPreprocessor": ([], FusedPreprocessor()),
+}
+
+
+@pytest.mark.parametrize("name", PREPROCESSOR_CHAINS)
+def test_preprocessor(
+    benchmark,  # noqa: ANN001
+    frames: tuple[pd.DataFrame, pd.DataFrame],
+    name: str,
+) -> None:
+    """Benchmark a single preprocessor on frames prepared by the ones before it."""
+    before, preprocessor = PREPROCESSOR_CHAINS[name]
+    prepared = run_preprocessors(before, frames[0].copy(), frames[1].copy())
+
+    def setup() -> tuple[tuple, dict]:
+        return ([preprocessor], prepared[0].copy(), prepared[1].copy()), {}
+
+    report, _ = benchmark.pedantic(run_preprocessors, setup=setup, rounds=10)
+    assert len(report)
+
+
+def test_bids_model(benchmark, export_dir: Path) -> None:  # noqa: ANN001
+    """Benchmark constructing the BIDS model, including preprocessing."""
+
+    def setup() -> tuple[tuple, dict]:
+        return (GraphomotorReport.create(export_dir),), {}
+
+    model = benchmark.pedantic(GraphomotorReport.bids_model, setup=setup, rounds=5)
+    assert model is not None
+
+
+def test_cli(benchmark, export_dir: Path, tmp_path: Path) -> None:  # noqa: ANN001
+    """Benchmark the full conversion of the command-line interface."""
+    rounds = iter(range(1_000_000))
+
+    def setup() -> tuple[tuple, dict]:
+        return ([export_dir], tmp_path / f"bids-{next(rounds)}", CONFIG), {}
+
+    assert benchmark.pedantic(main, setup=setup, rounds=3)
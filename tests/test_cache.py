@@ -0,0 +1,87 @@
+"""Preprocessed cache hits only for unchanged sources and preprocessor chain."""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from mindlogger_graphomotor import cache, schemas
+from mindlogger_graphomotor.cache import CACHE_DIRNAME, PreprocessedCache
+from mindlogger_graphomotor.graphomotor import (
+    ALL_REPORT_PREPROCESSORS,
+    FAST_REPORT_PREPROCESSORS,
+    GraphomotorReport,
+)
+from mindlogger_graphomotor.report_preprocessors import (
+    ReportPreprocessor,
+    default_preprocessors,
+)
+from mindlogger_graphomotor.synthetic import write_synthetic_export
+
+pytest.importorskip("pyarrow")
+
+
+def _cached(
+    export_dir: Path, preprocessors: list[ReportPreprocessor]
+) -> tuple[pd.DataFrame, pd.DataFrame] | None:
+    """Cached frames of export for preprocessor chain, or None on a miss."""
+    return PreprocessedCache(
+        export_dir / CACHE_DIRNAME,
+        [export_dir / "report.csv", export_dir / "activity_user_journey.csv"],
+        preprocessors,
+    ).load()
+
+
+def test_cache_misses_on_changed_csv_or_chain(tmp_path: Path) -> None:
+    """Cached frames are reused until a CSV or the preprocessor chain changes."""
+    export_dir = write_synthetic_export(tmp_path, subjects=3)
+    GraphomotorReport.create(export_dir, cache=True).preprocess()
+    assert _cached(export_dir, ALL_REPORT_PREPROCESSORS) is not None
+    assert _cached(export_dir, FAST_REPORT_PREPROCESSORS) is None
+
+    # The cache holds one entry, which loading with another key removed.
+    GraphomotorReport.create(export_dir, cache=True).preprocess()
+    assert _cached(export_dir, ALL_REPORT_PREPROCESSORS) is not None
+    report = pd.read_csv(export_dir / "report.csv")
+    report.loc[report.item == "value_q", "response"] = "value: 4"
+    report.to_csv(export_dir / "report.csv", index=False)
+    assert _cached(export_dir, ALL_REPORT_PREPROCESSORS) is None
+
+
+def test_cache_misses_on_other_version_or_dtypes(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Frames cached by another package version or with other dtypes are stale."""
+    export_dir = write_synthetic_export(tmp_path, subjects=3)
+    GraphomotorReport.create(export_dir, cache=True).preprocess()
+    assert _cached(export_dir, ALL_REPORT_PREPROCESSORS) is not None
+    with monkeypatch.context() as patch:
+        patch.setitem(schemas.REPORT_DTYPES, "item", schemas.STRING_DTYPE)
+        assert _cached(export_dir, ALL_REPORT_PREPROCESSORS) is None
+
+    GraphomotorReport.create(export_dir, cache=True).preprocess()
+    monkeypatch.setattr(cache, "package_version", lambda: "0.0.0")
+    assert _cached(export_dir, ALL_REPORT_PREPROCESSORS) is None
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_cached_timestamps_keep_row_offsets(tmp_path: Path, lazy: bool) -> None:
+    """Reports read with the cache have the timestamps of the first run."""
+    export_dir = write_synthetic_export(tmp_path, subjects=3)
+    report = pd.read_csv(export_dir / "report.csv")
+    report.loc[report.secret_user_id == "S00001", "timezone_offset"] = 330
+    report.to_csv(export_dir / "report.csv", index=False)
+    preprocessors = default_preprocessors(timezone=None, lazy_timestamps=lazy)
+
+    runs = [
+        [
+            entity["metadata"]["activity_start_time"]
+            for entity in GraphomotorReport.create(
+                export_dir, cache=True, preprocessors=preprocessors
+            ).bids_entities()
+            if "metadata" in entity
+        ]
+        for _ in range(2)
+    ]
+    assert runs[0] == runs[1]
+    assert {timestamp[-6:] for timestamp in runs[0]} == {"-04:00", "+05:30"}
+    assert (_cached(export_dir, preprocessors) is not None) == lazy
@@ -0,0 +1,67 @@
+"""Content store keeps one file per distinct artifact across exports."""
+
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+from mindlogger_graphomotor.artifacts import FileArtifact, ZipArtifactStore
+from mindlogger_graphomotor.content_store import ContentStore
+from mindlogger_graphomotor.passthrough import passthrough_copies
+from mindlogger_graphomotor.synthetic import EXPORT_DATE, write_synthetic_export
+
+
+def test_identical_artifacts_are_stored_once(tmp_path: Path) -> None:
+    """Members of two identical exports and extracted copies share stored files."""
+    store = ContentStore(tmp_path / "store")
+    paths = []
+    for export in ("first", "second"):
+        archive = write_synthetic_export(tmp_path / export, subjects=2) / (
+            f"drawing-responses-{EXPORT_DATE}.zip"
+        )
+        artifacts = ZipArtifactStore(archive, archive.with_suffix("")).artifacts()
+        paths.append([store.add(artifact) for artifact in artifacts])
+        extracted = artifacts[0].path()
+        assert store.add(FileArtifact(extracted)) == paths[-1][0]
+        assert paths[-1][0].read_bytes() == extracted.read_bytes()
+    assert paths[0] == paths[1]
+    assert len(list(store.directory.rglob("*.csv"))) == len(set(paths[0]))
+
+
+def test_artifacts_with_equal_content_keys_are_stored_by_content(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Different content is stored apart even if content keys collide."""
+    monkeypatch.setattr(FileArtifact, "content_key", lambda self: "00000000-4")
+    store = ContentStore(tmp_path / "store")
+    paths = []
+    for name, content in (("a.csv", b"x,y\n"), ("b.csv", b"y,x\n")):
+        (tmp_path / name).write_bytes(content)
+        paths.append(store.add(FileArtifact(tmp_path / name)))
+        assert paths[-1].read_bytes() == content
+    assert paths[0] != paths[1]
+
+
+@pytest.mark.parametrize("mode", [None, "reflink"])
+def test_stored_files_survive_overwriting_linked_outputs(
+    tmp_path: Path, mode: str | None
+) -> None:
+    """Writing over a BIDS output linked to the store replaces the output only."""
+    store = ContentStore(tmp_path / "store")
+    (tmp_path / "old.csv").write_bytes(b"x,y\n")
+    stored = store.add(FileArtifact(tmp_path / "old.csv"))
+    assert stored.stat().st_mode & 0o777 == 0o444
+    output = tmp_path / "bids" / "output.csv"
+    output.parent.mkdir()
+    with passthrough_copies("hardlink"):
+        shutil.copy(stored, output)
+    assert os.path.samefile(stored, output)
+
+    (tmp_path / "new.csv").write_bytes(b"y,x\n")
+    with passthrough_copies(mode):
+        shutil.copy(tmp_path / "new.csv", output)
+    with store.add(FileArtifact(tmp_path / "new.csv")).open("rb") as file:
+        assert output.read_bytes() == file.read()
+    for path in store.directory.rglob("*.csv"):
+        assert hashlib.sha256(path.read_bytes()).hexdigest() == path.stem
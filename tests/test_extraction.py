@@ -0,0 +1,89 @@
+"""Extraction of response zip archives."""
+
+import shutil
+from pathlib import Path
+from zipfile import ZipFile
+
+import pytest
+from mindlogger_graphomotor.artifacts import DirectoryArtifactStore
+from mindlogger_graphomotor.extraction import MANIFEST_FILENAME, extract_archives
+from mindlogger_graphomotor.passthrough import passthrough_copies
+from mindlogger_graphomotor.synthetic import write_synthetic_export
+
+
+def _tree(directory: Path) -> dict[str, bytes]:
+    """Contents of files below directory by relative path, without manifest."""
+    return {
+        path.relative_to(directory).as_posix(): path.read_bytes()
+        for path in directory.rglob("*")
+        if path.is_file() and path.name != MANIFEST_FILENAME
+    }
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_parallel_extraction_matches_extractall(
+    tmp_path: Path, use_processes: bool
+) -> None:
+    """Members spread over workers give the tree of a sequential extractall."""
+    export_dir = write_synthetic_export(tmp_path / "export", subjects=4)
+    archives = sorted(export_dir.glob("*.zip"))
+    stats = extract_archives(
+        {archive: tmp_path / "parallel" / archive.stem for archive in archives},
+        max_workers=3,
+        use_processes=use_processes,
+    )
+    for archive in archives:
+        with ZipFile(archive) as zip_file:
+            zip_file.extractall(tmp_path / "extractall" / archive.stem)
+    expected = _tree(tmp_path / "extractall")
+    assert stats.files == len(expected)
+    assert _tree(tmp_path / "parallel") == expected
+
+
+def test_incremental_extraction_skips_unchanged_and_prunes_removed(
+    tmp_path: Path,
+) -> None:
+    """Only changed members are extracted again, and dropped members removed."""
+    export_dir = write_synthetic_export(tmp_path / "export", subjects=3)
+    archive = next(export_dir.glob("drawing-responses-*.zip"))
+    destination = tmp_path / "extracted"
+    first = extract_archives({archive: destination})
+    assert first.files > 0
+    assert extract_archives({archive: destination}).files == 0
+
+    with ZipFile(archive) as zip_file:
+        members = {info.filename: zip_file.read(info) for info in zip_file.infolist()}
+    changed, removed, *_ = members
+    members[changed] = b"x,y,time\n0.5,0.5,0\n"
+    del members[removed]
+    with ZipFile(archive, "w") as zip_file:
+        for name, content in members.items():
+            zip_file.writestr(name, content)
+
+    assert extract_archives({archive: destination}).files == 1
+    assert _tree(destination) == members
+    assert {
+        artifact.name for artifact in DirectoryArtifactStore(destination).artifacts()
+    } == set(members)
+
+
+def test_extraction_replaces_files_linked_into_bids(tmp_path: Path) -> None:
+    """Extracting a changed member again leaves outputs linked to it unchanged."""
+    export_dir = write_synthetic_export(tmp_path / "export", subjects=1)
+    archive = next(export_dir.glob("drawing-responses-*.zip"))
+    destination = tmp_path / "extracted"
+    extract_archives({archive: destination})
+    with ZipFile(archive) as zip_file:
+        members = {info.filename: zip_file.read(info) for info in zip_file.infolist()}
+    changed = next(iter(members))
+    output = tmp_path / "output.csv"
+    with passthrough_copies("hardlink"):
+        shutil.copy(destination / changed, output)
+
+    members[changed] = b"x,y,time\n0.5,0.5,0\n"
+    with ZipFile(archive, "w") as zip_file:
+        for name, content in members.items():
+            zip_file.writestr(name, content)
+    assert extract_archives({archive: destination}).files == 1
+    assert (destination / changed).read_bytes() == members[changed]
+    assert output.read_bytes() != members[changed]
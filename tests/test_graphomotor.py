@@ -0,0 +1,219 @@
+"""BIDS entities of synthetic exports."""
+
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+import pytest
+from mindlogger_graphomotor.artifacts import ZipArtifactStore
+from mindlogger_graphomotor.graphomotor import (
+    ALL_VERSION_PROCESSORS,
+    GraphomotorReport,
+)
+from mindlogger_graphomotor.instrumentation import Instrumentation, collecting
+from mindlogger_graphomotor.synthetic import write_synthetic_export
+from mindlogger_graphomotor.version_processors import (
+    DefaultDataProcessor,
+    NewDataProcessor,
+    parse_version,
+    select_processor,
+)
+
+
+def _comparable(entity: dict) -> dict:
+    """Entity with DataFrame resources replaced by their CSV."""
+    resource = entity.get("resource")
+    if isinstance(resource, pd.DataFrame):
+        return {**entity, "resource": resource.to_csv(index=False)}
+    return entity
+
+
+def test_iter_bids_entities_matches_bids_entities(tmp_path: Path) -> None:
+    """Lazily loaded entities equal the eagerly loaded ones, in order."""
+    export_dir = write_synthetic_export(tmp_path, subjects=3, files_per_item=2)
+    eager = GraphomotorReport.create(export_dir).bids_entities()
+    lazy = GraphomotorReport.create(export_dir).iter_bids_entities(block_rows=5)
+    assert [_comparable(entity) for entity in lazy] == [
+        _comparable(entity) for entity in eager
+    ]
+
+
+@pytest.fixture
+def new_data_processor() -> Iterator[NewDataProcessor]:
+    """Let reports dispatch rows of new versions to a NewDataProcessor."""
+    processor = NewDataProcessor()
+    ALL_VERSION_PROCESSORS.insert(0, processor)
+    yield processor
+    ALL_VERSION_PROCESSORS.remove(processor)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+@pytest.mark.usefixtures("new_data_processor")
+def test_rows_are_dispatched_to_processor_of_their_version(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, lazy: bool
+) -> None:
+    """Each row of a mixed version report goes to the processor of its version.
+
+    Rows of new versions go to the NewDataProcessor, and the others, including
+    those of unparseable versions, to the DefaultDataProcessor.
+    """
+    dispatched: list[tuple[type, pd.DataFrame]] = []
+
+    def record(processor: Any, frame: pd.DataFrame, *args: Any) -> None:  # noqa: ANN401
+        dispatched.append((type(processor), frame))
+
+    export_dir = write_synthetic_export(tmp_path, subjects=3)
+    report = pd.read_csv(export_dir / "report.csv")
+    report["version"] = [
+        ("14.7.0", "1.2.3", "not a version")[position % 3]
+        for position in range(len(report))
+    ]
+    report.to_csv(export_dir / "report.csv", index=False)
+    for processor_class in (NewDataProcessor, DefaultDataProcessor):
+        monkeypatch.setattr(processor_class, "process_report_frame", record)
+    graphomotor_report = GraphomotorReport.create(export_dir)
+    if lazy:
+        list(graphomotor_report.iter_bids_entities(block_rows=4))
+    else:
+        list(graphomotor_report.bids_entities())
+
+    assert sum(len(frame) for _, frame in dispatched) == len(graphomotor_report)
+    assert {
+        (processor, version)
+        for processor, frame in dispatched
+        for version in frame.version
+    } == {
+        (NewDataProcessor, "14.7.0"),
+        (DefaultDataProcessor, "1.2.3"),
+        (DefaultDataProcessor, "not a version"),
+    }
+    for processor, frame in dispatched:
+        for version in frame.version:
+            selected = select_processor(
+                ALL_VERSION_PROCESSORS, [parse_version(version)]
+            )
+            assert type(selected) is processor
+
+
+def test_bids_entities_load_responses_in_processes(tmp_path: Path) -> None:
+    """Responses loaded by a process pool give the entities of a serial load."""
+    export_dir = write_synthetic_export(tmp_path, subjects=3, files_per_item=2)
+    serial = GraphomotorReport.create(export_dir).bids_entities()
+    parallel = GraphomotorReport.create(export_dir).bids_entities(
+        load_workers=3, load_processes=True
+    )
+    assert [_comparable(entity) for entity in parallel] == [
+        _comparable(entity) for entity in serial
+    ]
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_parse_response_counts_response_files(tmp_path: Path, lazy: bool) -> None:
+    """Responses parsed are counted as files only if they are not values."""
+    export_dir = write_synthetic_export(tmp_path, subjects=3)
+    report = GraphomotorReport.create(export_dir)
+    with collecting(Instrumentation()) as instrumentation:
+        if lazy:
+            entities = list(report.iter_bids_entities())
+        else:
+            entities = list(report.bids_entities())
+    files = sum(
+        not isinstance(entity["resource"], pd.DataFrame)
+        or "value" not in entity["resource"].columns
+        for entity in entities
+        if entity["task_name"] != "activities"
+    )
+    parsed = instrumentation.stages["parse_response"]
+    assert 0 < files < parsed.rows
+    assert parsed.files == files
+
+
+def test_split_subjects_partitions_entities(tmp_path: Path) -> None:
+    """Shards hold whole subjects and together give the entities of the report."""
+    export_dir = write_synthetic_export(tmp_path, subjects=5)
+    report = GraphomotorReport.create(export_dir)
+    shards = report.split_subjects(3)
+    shard_entities = [
+        repr(_comparable(entity))
+        for shard in shards
+        for entity in shard.bids_entities()
+    ]
+    subjects = [
+        {entity["subject_id"] for entity in shard.bids_entities()} for shard in shards
+    ]
+    assert len(shards) == 3
+    assert sum(len(shard) for shard in shards) == len(report)
+    assert sum(len(shard_subjects) for shard_subjects in subjects) == 5
+    assert sorted(shard_entities) == sorted(
+        repr(_comparable(entity)) for entity in report.bids_entities()
+    )
+
+
+def test_stream_in_chunks_matches_create(tmp_path: Path) -> None:
+    """Chunked reports give the entities of the whole report, by whole subjects.
+
+    The report has a partial crashed attempt at the end, duplicating some rows
+    of a study in another chunk, and a study_id row without response, whose
+    rows take the study_id of the next study. The activity has a repeated
+    session at the end. Runs are numbered per model, so each subject and task
+    must be in a single chunk.
+    """
+    export_dir = write_synthetic_export(tmp_path, subjects=4, files_per_item=2)
+    report = pd.read_csv(export_dir / "report.csv")
+    report.loc[
+        (report.secret_user_id == "S00001") & (report.item == "study_id"), "response"
+    ] = None
+    crashed = report[
+        (report.secret_user_id == "S00000") & (report.item_id != "trail2")
+    ].copy()
+    crashed["activity_start_time"] = report.activity_start_time.min() - 60_000
+    crashed["response"] = crashed.response.where(crashed.item != "value_q", "value: 5")
+    pd.concat([report, crashed]).to_csv(export_dir / "report.csv", index=False)
+    activity = pd.read_csv(export_dir / "activity_user_journey.csv")
+    repeated = activity[activity.secret_user_id == "S00000"]
+    pd.concat([activity, repeated]).to_csv(
+        export_dir / "activity_user_journey.csv", index=False
+    )
+
+    whole = list(GraphomotorReport.create(export_dir).bids_entities())
+    chunks = [
+        list(chunk.bids_entities())
+        for chunk in GraphomotorReport.stream(export_dir, chunksize=5)
+    ]
+    chunked = [entity for entities in chunks for entity in entities]
+    assert any("value: 5" in repr(entity) for entity in whole)
+    tasks = [
+        task
+        for entities in chunks
+        for task in {(entity["subject_id"], entity["task_name"]) for entity in entities}
+    ]
+    assert len(chunks) > 2
+    assert len(tasks) == len(set(tasks))
+    assert sorted(repr(_comparable(entity)) for entity in chunked) == sorted(
+        repr(_comparable(entity)) for entity in whole
+    )
+
+
+def test_stream_records_deferred_artifacts_and_closes_stores(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Deferred paths are recorded on their report, and stores closed at the end."""
+    closed = []
+    monkeypatch.setattr(
+        ZipArtifactStore, "close", lambda store: closed.append(store.archive)
+    )
+    export_dir = write_synthetic_export(tmp_path, subjects=2)
+    reports = GraphomotorReport.stream(export_dir)
+    report = next(reports)
+    paths = [
+        entity["resource"]
+        for entity in report.bids_entities(stream_artifacts=True)
+        if isinstance(entity["resource"], Path)
+    ]
+    assert paths
+    assert set(paths) == set(report.deferred_artifacts)
+    assert not any(path.exists() for path in paths)
+    assert not closed
+    assert next(reports, None) is None
+    assert len(closed) == 3
@@ -0,0 +1,102 @@
+"""Stage metrics export and merging across processes."""
+
+import asyncio
+import json
+import threading
+from pathlib import Path
+
+from mindlogger_graphomotor.instrumentation import (
+    Instrumentation,
+    StageMetrics,
+    collecting,
+    stage,
+)
+
+
+def _metrics(name: str, rows: int, process_peak_rss_bytes: int) -> StageMetrics:
+    """Metrics of one run of stage."""
+    metrics = StageMetrics(name)
+    metrics.calls = 1
+    metrics.wall_seconds = 0.5
+    metrics.cpu_seconds = 0.25
+    metrics.process_peak_rss_bytes = process_peak_rss_bytes
+    metrics.rows = rows
+    metrics.files = 1
+    return metrics
+
+
+def test_merge_adds_counts_and_keeps_peak() -> None:
+    """Merged metrics add counts and times, and keep the highest process peak RSS."""
+    instrumentation = Instrumentation()
+    instrumentation.record(_metrics("load", 10, 100))
+    other = Instrumentation()
+    other.record(_metrics("load", 5, 300))
+    other.record(_metrics("write", 2, 200))
+    instrumentation.merge(json.loads(other.to_json()))
+    assert instrumentation.to_dict() == {
+        "load": {
+            "calls": 2,
+            "wall_seconds": 1.0,
+            "cpu_seconds": 0.5,
+            "process_peak_rss_bytes": 300,
+            "rows": 15,
+            "files": 2,
+        },
+        "write": _metrics("write", 2, 200).to_dict(),
+    }
+
+
+def test_stage_records_only_while_collecting() -> None:
+    """Stages are recorded in the collecting instrumentation, with their counts."""
+    with stage("ignored"):
+        pass
+    with collecting(Instrumentation()) as instrumentation:
+        with stage("load", rows=3) as counter:
+            counter.files = 2
+    assert list(instrumentation.stages) == ["load"]
+    assert instrumentation.stages["load"].rows == 3
+    assert instrumentation.stages["load"].files == 2
+
+
+def test_stages_are_recorded_per_thread() -> None:
+    """Threads collect their stages apart, and to_thread stages are collected."""
+    started = threading.Barrier(2)
+    collected: dict[str, Instrumentation] = {}
+
+    def build(name: str) -> None:
+        with stage(f"{name}.build"):
+            pass
+
+    def convert(name: str) -> None:
+        with collecting(Instrumentation()) as instrumentation:
+            started.wait()
+            with stage(name):
+                started.wait()
+            asyncio.run(asyncio.to_thread(build, name))
+        collected[name] = instrumentation
+
+    threads = [threading.Thread(target=convert, args=(name,)) for name in "ab"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert {name: list(collected[name].stages) for name in "ab"} == {
+        "a": ["a", "a.build"],
+        "b": ["b", "b.build"],
+    }
+
+
+def test_write_prometheus_and_json(tmp_path: Path) -> None:
+    """Metrics are written in Prometheus format for .prom paths, else as JSON."""
+    instrumentation = Instrumentation()
+    instrumentation.record(_metrics('write "bids"', 4, 100))
+    instrumentation.write(tmp_path / "metrics.prom")
+    instrumentation.write(tmp_path / "metrics.json")
+
+    lines = (tmp_path / "metrics.prom").read_text().splitlines()
+    assert "# TYPE graphomotor_stage_calls_total counter" in lines
+    assert "# TYPE graphomotor_stage_process_peak_rss_bytes gauge" in lines
+    assert 'graphomotor_stage_rows_total{stage="write \\"bids\\""} 4' in lines
+    assert json.loads((tmp_path / "metrics.json").read_text()) == (
+        instrumentation.to_dict()
+    )
@@ -0,0 +1,92 @@
+"""Ledger digests change only with the inputs of their subject and task."""
+
+import zipfile
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from mindlogger_graphomotor.batch import check_partial_writes
+from mindlogger_graphomotor.graphomotor import GraphomotorReport
+from mindlogger_graphomotor.ledger import ConversionLedger, conversion_settings
+from mindlogger_graphomotor.synthetic import EXPORT_DATE, write_synthetic_export
+
+CONFIG = Path(__file__).parents[1] / "config" / "graphomotor.toml"
+INCREMENTAL_CONFIG = CONFIG.with_name("graphomotor-incremental.toml")
+
+
+def _rewrite_member(archive: Path, name: str, content: str) -> None:
+    """Replace content of a zip archive member."""
+    with zipfile.ZipFile(archive) as zip_file:
+        members = {info.filename: zip_file.read(info) for info in zip_file.infolist()}
+    members[name] = content.encode()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        for member, data in members.items():
+            zip_file.writestr(member, data)
+
+
+def test_task_digests_change_with_rows_and_artifacts(tmp_path: Path) -> None:
+    """Changing a value row or a drawing file changes only the digest of its task."""
+    export_dir = write_synthetic_export(tmp_path, subjects=3)
+    before = GraphomotorReport.create(export_dir).task_digests()
+    assert before == GraphomotorReport.create(export_dir).task_digests()
+
+    report = pd.read_csv(export_dir / "report.csv")
+    value_row = (report.secret_user_id == "S00001") & (report.item == "value_q")
+    report.loc[value_row, "response"] = "value: 4"
+    report.to_csv(export_dir / "report.csv", index=False)
+    drawing = report[
+        (report.secret_user_id == "S00002") & (report.item_id == "drawing_a1")
+    ]
+    _rewrite_member(
+        export_dir / f"drawing-responses-{EXPORT_DATE}.zip",
+        drawing.response.iloc[0],
+        "x,y,time\n0.5,0.5,0\n",
+    )
+
+    after = GraphomotorReport.create(export_dir).task_digests()
+    assert after.keys() == before.keys()
+    assert {key for key in before if before[key] != after[key]} == {
+        ("S00001", "value_q"),
+        ("S00002", "drawing_a"),
+    }
+
+
+def test_ledger_saves_recorded_tasks(tmp_path: Path) -> None:
+    """Recorded tasks are unchanged for a ledger read after saving."""
+    ledger = ConversionLedger(tmp_path)
+    digests = {("S1", "drawing"): "a", ("S1", "activities"): "b"}
+    assert ledger.changed(digests) == digests
+    ledger.record(digests)
+    ledger.save()
+    ledger = ConversionLedger(tmp_path)
+    assert ledger.changed(digests) == {}
+    assert ledger.changed({("S1", "drawing"): "c"}) == {("S1", "drawing"): "c"}
+
+
+def test_ledger_is_ignored_for_other_settings(tmp_path: Path) -> None:
+    """Tasks recorded with another config are changed after editing the config."""
+    config = tmp_path / "config.toml"
+    config.write_bytes(CONFIG.read_bytes())
+    digests = {("S1", "drawing"): "a"}
+    ledger = ConversionLedger(tmp_path, conversion_settings(config))
+    ledger.record(digests)
+    ledger.save()
+    assert (
+        ConversionLedger(tmp_path, conversion_settings(config)).changed(digests) == {}
+    )
+
+    config.write_text(config.read_text().replace("clean_fields = true", ""))
+    ledger = ConversionLedger(tmp_path, conversion_settings(config))
+    assert ledger.changed(digests) == digests
+
+
+def test_partial_writes_need_merged_subject_directories() -> None:
+    """Partial writes need the incremental config, a merging copy of the default."""
+    with pytest.raises(ValueError, match="subject_dir"):
+        check_partial_writes(CONFIG)
+    check_partial_writes(INCREMENTAL_CONFIG)
+    assert (
+        INCREMENTAL_CONFIG.read_text()
+        .replace("MERGE", "OVERWRITE")
+        .endswith(CONFIG.read_text().replace("MERGE", "OVERWRITE"))
+    )
@@ -0,0 +1,88 @@
+"""Placement of response files in the BIDS tree without rewriting them."""
+
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import pytest
+from mindlogger_graphomotor import passthrough
+from mindlogger_graphomotor.artifacts import ZipArtifactStore
+from mindlogger_graphomotor.passthrough import link_or_copy, passthrough_copies
+from mindlogger_graphomotor.synthetic import EXPORT_DATE, write_synthetic_export
+
+
+def _fail(source: Path, destination: Path) -> None:
+    """Placement method that is not available."""
+    raise OSError("not supported")
+
+
+@pytest.mark.parametrize(
+    ("mode", "failing", "expected"),
+    [
+        ("hardlink", [], "hardlink"),
+        ("hardlink", ["_hardlink", "_reflink"], "copy_file_range"),
+        ("reflink", ["_reflink"], "copy_file_range"),
+        ("reflink", ["_reflink", "_copy_file_range"], "copy"),
+        ("hardlink", ["_hardlink", "_reflink", "_copy_file_range"], "copy"),
+    ],
+)
+def test_link_or_copy_falls_back(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    mode: str,
+    failing: list[str],
+    expected: str,
+) -> None:
+    """Methods are tried in order, and destination always holds the source."""
+    if expected == "copy_file_range" and not hasattr(os, "copy_file_range"):
+        pytest.skip("os.copy_file_range not available.")
+    for method in failing:
+        monkeypatch.setattr(passthrough, method, _fail)
+    source = tmp_path / "source.csv"
+    source.write_bytes(b"x,y\n1,2\n")
+    destination = tmp_path / "destination.csv"
+    destination.write_bytes(b"stale")
+
+    assert link_or_copy(source, destination, mode) == expected
+    assert destination.read_bytes() == source.read_bytes()
+    assert os.path.samefile(source, destination) == (expected == "hardlink")
+
+
+def test_link_or_copy_rejects_unknown_mode(tmp_path: Path) -> None:
+    """Unknown modes raise instead of copying."""
+    with pytest.raises(ValueError, match="Unknown passthrough mode"):
+        link_or_copy(tmp_path / "source", tmp_path / "destination", "symlink")
+
+
+def test_passthrough_copies_only_in_its_context(tmp_path: Path) -> None:
+    """Copies of the block are linked, those of other threads are not."""
+    source = tmp_path / "source.csv"
+    source.write_text("x,y\n1,2\n")
+    copyfile = shutil.copyfile
+    with passthrough_copies("hardlink") as methods:
+        shutil.copy(source, tmp_path / "linked.csv")
+        thread = threading.Thread(
+            target=shutil.copy, args=(source, tmp_path / "copied.csv")
+        )
+        thread.start()
+        thread.join()
+    assert shutil.copyfile is copyfile
+    assert methods == {"hardlink": 1}
+    assert os.path.samefile(source, tmp_path / "linked.csv")
+    assert not os.path.samefile(source, tmp_path / "copied.csv")
+
+
+def test_passthrough_copies_streams_deferred_artifacts(tmp_path: Path) -> None:
+    """Copies of deferred paths stream zip members without extracting them."""
+    archive = write_synthetic_export(tmp_path / "export", subjects=1) / (
+        f"drawing-responses-{EXPORT_DATE}.zip"
+    )
+    artifact = ZipArtifactStore(archive, tmp_path / "extracted").artifacts()[0]
+    path = artifact.deferred_path()
+    with passthrough_copies(None, {path: artifact}) as methods:
+        shutil.copy(path, tmp_path / "streamed.csv")
+    assert methods == {"stream": 1}
+    assert not (tmp_path / "extracted").exists()
+    with artifact.open() as member:
+        assert (tmp_path / "streamed.csv").read_bytes() == member.read()
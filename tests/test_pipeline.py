@@ -0,0 +1,47 @@
+"""Pipelined writing of subject models."""
+
+import asyncio
+import threading
+from pathlib import Path
+from typing import Any
+
+import pytest
+from mindlogger_graphomotor import pipeline
+from mindlogger_graphomotor.graphomotor import GraphomotorReport
+from mindlogger_graphomotor.synthetic import write_synthetic_export
+
+
+def test_write_models_writes_subjects_in_order(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Each subject is written as one model, in order, one model at a time."""
+    models: list[list[dict[str, Any]]] = []
+    writing = threading.Lock()
+
+    def write_model(entities: list[dict[str, Any]], *args: object) -> None:
+        assert writing.acquire(blocking=False), "Models written concurrently."
+        try:
+            threading.Event().wait(0.001)
+            models.append(entities)
+        finally:
+            writing.release()
+
+    monkeypatch.setattr(pipeline, "write_model", write_model)
+    report = GraphomotorReport.create(
+        write_synthetic_export(tmp_path, subjects=6, files_per_item=2)
+    )
+    count = asyncio.run(
+        pipeline.write_models(
+            report.iter_subjects(),
+            lambda subject: list(subject.iter_bids_entities()),
+            tmp_path / "bids",
+            config=None,
+            build_workers=4,
+            queue_size=2,
+        )
+    )
+    assert count == 6
+    assert [{entity["subject_id"] for entity in model} for model in models] == [
+        {f"S{subject:05d}"} for subject in range(6)
+    ]
+    assert sum(len(model) for model in models) == len(list(report.bids_entities()))
@@ -0,0 +1,96 @@
+"""Equivalence of the fused preprocessor and the default preprocessor chain."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from mindlogger_graphomotor.report_preprocessors import (
+    CrashPreprocessor,
+    DateTimePreprocessor,
+    FusedPreprocessor,
+    ReportPreprocessor,
+    StudyIdPreprocessor,
+    run_preprocessors,
+)
+from mindlogger_graphomotor.schemas import STRING_DTYPE
+
+ITEMS = ["study_id", "cursive_q", "spiral", "trails", "STOP"]
+
+
+def _random_export(seed: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Random report and activity frames with export dtypes."""
+    rng = np.random.default_rng(seed)
+    n_rows = int(rng.integers(0, 80))
+    item = rng.choice(ITEMS, n_rows, p=[0.3, 0.2, 0.2, 0.2, 0.1])
+    response = rng.choice(np.array(["1", "2", "3", "STOP", None], dtype=object), n_rows)
+    timestamps = np.sort(rng.integers(0, 2 * 10**12, n_rows))[::-1]
+    frame = pd.DataFrame(
+        {
+            "item": pd.Categorical(item),
+            "item_id": pd.array([f"id-{value}" for value in item], dtype=STRING_DTYPE),
+            "response": pd.array(response, dtype=STRING_DTYPE),
+            "activity_start_time": pd.array(timestamps, dtype="Int64"),
+            "activity_end_time": pd.array(
+                rng.integers(0, 2 * 10**12, n_rows), dtype="Int64"
+            ),
+        }
+    )
+    activity = frame.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+    return frame, activity
+
+
+def _default_chain() -> list:
+    """Fresh instances of the default preprocessor chain."""
+    return [StudyIdPreprocessor(), DateTimePreprocessor(), CrashPreprocessor()]
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_fused_matches_default_chain(seed: int) -> None:
+    """Fused preprocessor gives the same frames as the default chain."""
+    report, activity = _random_export(seed)
+    expected = run_preprocessors(_default_chain(), report.copy(), activity.copy())
+    fused = run_preprocessors([FusedPreprocessor()], report.copy(), activity.copy())
+    pd.testing.assert_frame_equal(fused[0], expected[0])
+    pd.testing.assert_frame_equal(fused[1], expected[1])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_mask_chain_matches_calls(seed: int) -> None:
+    """Running the chain with a combined mask matches calling each preprocessor."""
+    report, activity = _random_export(seed)
+    expected = report.copy(), activity.copy()
+    for preprocessor in _default_chain():
+        expected = preprocessor(*expected)
+    masked = run_preprocessors(_default_chain(), report.copy(), activity.copy())
+    pd.testing.assert_frame_equal(masked[0], expected[0])
+    pd.testing.assert_frame_equal(masked[1], expected[1])
+
+
+def test_fused_requires_ordered_report() -> None:
+    """Fused preprocessor rejects reports not ordered by timestamp."""
+    report, activity = _random_export(1)
+    report = report.iloc[::-1].reset_index(drop=True)
+    with pytest.raises(ValueError, match="ordered by timestamp"):
+        run_preprocessors([FusedPreprocessor()], report, activity)
+
+
+class _DropCursiveQ(ReportPreprocessor):
+    """Preprocessor implementing only __call__, dropping cursive_q rows."""
+
+    def __call__(
+        self, report: pd.DataFrame, activity: pd.DataFrame
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """Drop cursive_q report rows."""
+        return report[report["item"] != "cursive_q"], activity
+
+
+def test_chain_calls_preprocessors_without_apply() -> None:
+    """Preprocessors only implementing __call__ see the rows kept so far."""
+    report, activity = _random_export(3)
+    chain = [StudyIdPreprocessor(), _DropCursiveQ(), CrashPreprocessor()]
+    expected = report.copy(), activity.copy()
+    for preprocessor in chain:
+        expected = preprocessor(*expected)
+    result = run_preprocessors(chain, report.copy(), activity.copy())
+    assert not (result[0]["item"] == "cursive_q").any()
+    pd.testing.assert_frame_equal(result[0], expected[0])
+    pd.testing.assert_frame_equal(result[1], expected[1])
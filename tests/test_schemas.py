@@ -0,0 +1,82 @@
+"""Export CSV files read with declared column dtypes."""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from mindlogger_graphomotor import schemas
+from mindlogger_graphomotor.schemas import (
+    REPORT_DTYPES,
+    STRING_DTYPE,
+    read_empty_export_csv,
+    read_export_csv,
+    read_export_csv_chunks,
+)
+from mindlogger_graphomotor.synthetic import write_synthetic_export
+
+
+def _assert_frames_equal(left: pd.DataFrame, right: pd.DataFrame) -> None:
+    """Assert frames are equal, but for the categories dtype of empty categories.
+
+    Engines give object or float64 categories to categorical columns without
+    values.
+    """
+    assert list(left.dtypes.astype(str)) == list(right.dtypes.astype(str))
+    categories = left.select_dtypes("category").columns
+    pd.testing.assert_frame_equal(
+        left.astype({column: object for column in categories}),
+        right.astype({column: object for column in categories}),
+    )
+
+
+@pytest.fixture
+def report_path(tmp_path: Path) -> Path:
+    """Report of a synthetic export, lacking the columns of new versions."""
+    return write_synthetic_export(tmp_path, subjects=3) / "report.csv"
+
+
+def test_declared_columns_have_declared_dtypes(report_path: Path) -> None:
+    """Declared columns are categories, strings or nullable integers."""
+    report = read_export_csv(report_path, REPORT_DTYPES)
+    assert isinstance(report.item.dtype, pd.CategoricalDtype)
+    assert isinstance(report.version.dtype, pd.CategoricalDtype)
+    assert report.response.dtype == STRING_DTYPE
+    assert report.activity_start_time.dtype == "Int64"
+    assert report.activity_scheduled_time.dtype == "Int64"
+    assert report.activity_scheduled_time.isna().all()
+
+
+def test_other_columns_are_skipped_or_inferred(report_path: Path) -> None:
+    """Declared columns missing from the file are not added, others are inferred."""
+    report = read_export_csv(report_path, REPORT_DTYPES)
+    assert not {"source_id", "target_id", "legacy_user_id"} & set(report.columns)
+    assert "timezone_offset" not in REPORT_DTYPES
+    assert report.timezone_offset.dtype == "int64"
+    assert list(report.columns) == list(pd.read_csv(report_path, nrows=0).columns)
+
+
+def test_reading_without_pyarrow_gives_same_frame(
+    report_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """The C engine fallback reads the frame of the pyarrow engine."""
+    report = read_export_csv(report_path, REPORT_DTYPES)
+    monkeypatch.setattr(schemas, "HAS_PYARROW", False)
+    _assert_frames_equal(read_export_csv(report_path, REPORT_DTYPES), report)
+
+
+def test_chunks_and_header_match_whole_read(report_path: Path) -> None:
+    """Chunks hold the rows of the whole frame, and the header has its dtypes."""
+    report = read_export_csv(report_path, REPORT_DTYPES)
+    chunks = list(read_export_csv_chunks(report_path, REPORT_DTYPES, chunksize=4))
+    assert len(chunks) > 1
+    assert sum(len(chunk) for chunk in chunks) == len(report)
+    for chunk in chunks:
+        _assert_frames_equal(chunk, report.loc[chunk.index])
+    empty = read_empty_export_csv(report_path, REPORT_DTYPES)
+    assert empty.empty
+    assert list(empty.columns) == list(report.columns)
+    assert {column: str(dtype) for column, dtype in empty.dtypes.items()}.items() >= {
+        column: str(report[column].dtype)
+        for column in REPORT_DTYPES
+        if column in report
+    }.items()
@@ -0,0 +1,35 @@
+"""Lazy timestamp formatting matches formatting of converted datetimes."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from mindlogger_graphomotor.timestamps import (
+    format_epoch_ms,
+    to_datetime,
+    to_offset_datetime,
+)
+
+
+def _epoch_ms(seed: int) -> pd.Series:
+    """Random epoch milliseconds with missing values."""
+    rng = np.random.default_rng(seed)
+    values = pd.Series(pd.array(rng.integers(0, 2 * 10**12, 50), dtype="Int64"))
+    values[rng.random(50) < 0.1] = pd.NA
+    return values
+
+
+@pytest.mark.parametrize("timezone", ["America/New_York", "UTC", "Asia/Kolkata"])
+def test_format_epoch_ms_in_timezone(timezone: str) -> None:
+    """Formatting in a timezone matches Timestamp.isoformat."""
+    epoch_ms = _epoch_ms(0)
+    expected = to_datetime(epoch_ms, timezone).map(lambda ts: ts.isoformat())
+    assert format_epoch_ms(epoch_ms, timezone).tolist() == expected.tolist()
+
+
+def test_format_epoch_ms_at_row_offsets() -> None:
+    """Formatting at per-row offsets matches Timestamp.isoformat."""
+    epoch_ms = _epoch_ms(1).fillna(0)
+    offsets = pd.Series(np.resize([-240, -300, 0, 330, 545, -570], len(epoch_ms)))
+    expected = to_offset_datetime(epoch_ms, offsets).map(lambda ts: ts.isoformat())
+    formatted = format_epoch_ms(epoch_ms, None, offsets)
+    assert formatted.tolist() == expected.tolist()
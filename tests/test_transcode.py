@@ -0,0 +1,16 @@
+"""CSV to TSV transcoding matches the DataFrame path."""
+
+import io
+
+import pandas as pd
+from mindlogger_graphomotor.transcode import transcode_csv_to_tsv
+
+
+def test_transcode_matches_dataframe_path() -> None:
+    """Transcoding gives the TSV written from a DataFrame of the CSV."""
+    source = 'x,y,"line,number",label\n1,2,3,a\n4,5,6,"with\ttab"\n7,8,9,\n'
+    target = io.BytesIO()
+    rows = transcode_csv_to_tsv(io.BytesIO(source.encode()), target)
+    expected = pd.read_csv(io.StringIO(source)).to_csv(sep="\t", index=False)
+    assert rows == 4
+    assert target.getvalue().decode() == expected
@@ -0,0 +1,88 @@
+"""Report frames give the entities of their rows processed one at a time."""
+
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+import pytest
+from mindlogger_graphomotor.report_preprocessors import (
+    default_preprocessors,
+    run_preprocessors,
+)
+from mindlogger_graphomotor.schemas import (
+    ACTIVITY_USER_JOURNEY_DTYPES,
+    REPORT_DTYPES,
+    read_export_csv,
+)
+from mindlogger_graphomotor.synthetic import write_synthetic_export
+from mindlogger_graphomotor.version_processors import (
+    DataVersionProcessor,
+    DefaultDataProcessor,
+    NewDataProcessor,
+    ReportResource,
+)
+
+
+class _Builder:
+    """Stand-in for BidsBuilder recording added entities."""
+
+    def __init__(self) -> None:
+        """Initialize empty builder."""
+        self.entities: list[dict[str, Any]] = []
+
+    def add(self, **entity: Any) -> "_Builder":  # noqa: ANN401
+        """Record entity."""
+        self.entities.append(entity)
+        return self
+
+
+def _mixed_report(tmp_path: Path) -> pd.DataFrame:
+    """Preprocessed report with missing values in string and number columns."""
+    export_dir = write_synthetic_export(tmp_path, subjects=3)
+    report = pd.read_csv(export_dir / "report.csv")
+    report["flag"] = pd.Series("flagged", index=report.index).where(
+        report.index % 2 == 0
+    )
+    report.loc[::3, "rawScore"] = 2.5
+    report.loc[::4, "timezone_offset"] = None
+    report["source_id"] = ["source"] * (len(report) - 1) + [None]
+    report["target_id"] = None
+    report["legacy_user_id"] = "legacy"
+    report.to_csv(export_dir / "report.csv", index=False)
+    report, _ = run_preprocessors(
+        default_preprocessors(),
+        read_export_csv(export_dir / "report.csv", REPORT_DTYPES),
+        read_export_csv(
+            export_dir / "activity_user_journey.csv", ACTIVITY_USER_JOURNEY_DTYPES
+        ),
+    )
+    return report
+
+
+@pytest.mark.parametrize("processor", [DefaultDataProcessor(), NewDataProcessor()])
+def test_report_frame_matches_report_rows(
+    tmp_path: Path, processor: DataVersionProcessor
+) -> None:
+    """Entities of a frame equal those of its rows, in order."""
+    report = _mixed_report(tmp_path)
+    resources: list[ReportResource] = [
+        Path(f"{position}.csv") for position in range(len(report))
+    ]
+    by_frame = _Builder()
+    processor.process_report_frame(report, resources, by_frame)  # type: ignore[arg-type]
+    by_row = _Builder()
+    for row, resource in zip(report.itertuples(name="Row"), resources):
+        processor.process_report_row(row, resource, by_row)  # type: ignore[arg-type]
+
+    assert by_frame.entities == by_row.entities
+    metadata = [entity["metadata"] for entity in by_frame.entities]
+    assert len(metadata) == (report.item != "study_id").sum()
+    # Each timestamp is read from its own column.
+    assert all(
+        fields["activity_end_time"] > fields["activity_start_time"]
+        for fields in metadata
+    )
+    # Missing values are null, not NaN, so that sidecars are valid JSON.
+    assert {fields["flag"] for fields in metadata} == {"flagged", None}
+    assert {fields["rawScore"] for fields in metadata} == {2.5, None}
+    assert None in {fields["timezone_offset"] for fields in metadata}
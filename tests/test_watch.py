@@ -0,0 +1,73 @@
+"""Watched inboxes convert each uploaded export once it has settled."""
+
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from mindlogger_graphomotor import watch
+from mindlogger_graphomotor.batch import ExportResult
+from mindlogger_graphomotor.synthetic import write_synthetic_export
+from mindlogger_graphomotor.watch import ExportWatcher
+
+CONFIG = Path(__file__).parents[1] / "config" / "graphomotor-incremental.toml"
+SETTLE_SECONDS = 0.5
+
+
+def test_polling_converts_settled_export_once(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A report written while the watcher polls is converted once, complete."""
+    converted: list[tuple[Path, int]] = []
+    done = threading.Event()
+
+    def convert(export_dir: Path, *args: object, **kwargs: object) -> ExportResult:
+        converted.append((export_dir, (export_dir / "report.csv").stat().st_size))
+        done.set()
+        return ExportResult(export_dir, 0.1, rows=1)
+
+    monkeypatch.setattr(watch, "HAS_WATCHDOG", False)
+    monkeypatch.setattr(watch, "convert_export", convert)
+    source = write_synthetic_export(tmp_path / "source", subjects=3)
+    inbox = tmp_path / "inbox"
+    export_dir = inbox / "export"
+    shutil.copytree(source, export_dir)
+    report = (source / "report.csv").read_bytes()
+    (export_dir / "report.csv").write_bytes(b"")
+
+    stop = threading.Event()
+    watcher = ExportWatcher(
+        inbox,
+        tmp_path / "bids",
+        CONFIG,
+        settle_seconds=SETTLE_SECONDS,
+        poll_interval=0.02,
+        incremental=True,
+    )
+    thread = threading.Thread(target=watcher.run, args=(stop,))
+    thread.start()
+    try:
+        # Keep writing for several settle periods, more often than it settles.
+        for line in report.splitlines(keepends=True):
+            with (export_dir / "report.csv").open("ab") as report_file:
+                report_file.write(line)
+            time.sleep(SETTLE_SECONDS / 10)
+        assert done.wait(5.0)
+        time.sleep(SETTLE_SECONDS * 3)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert converted == [(export_dir, len(report))]
+
+
+def test_watching_warns_without_incremental(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Without the ledger, restarts convert exports again, so watchers warn."""
+    ExportWatcher(tmp_path, tmp_path / "bids", CONFIG)
+    assert "converted again after a restart" in caplog.text
+    caplog.clear()
+    ExportWatcher(tmp_path, tmp_path / "bids", CONFIG, incremental=True)
+    assert not caplog.text